@@ -1,9 +1,16 @@
 # app.py
-from flask import Flask, render_template, request, flash, send_file, session, redirect
+from flask import Flask, render_template, request, flash, session, redirect, Response, stream_with_context, jsonify, abort, g
 import os
+import time
+import uuid
 from werkzeug.utils import secure_filename
-import zipfile
-import io
+from engine import PROFILES, TEMPLATES, OUTPUT_OPTIONS, preload
+from jobs import submit_job, get_job, record_preview, claim_preview
+from preview import parse_row_selection, render_preview, png_data_url
+from roster import ROSTER_EXTENSIONS, check_roster
+from verify_index import lookup, lookup_many
+from zip_stream import stream_zip, directory_entries
+import metrics
 
 app = Flask(__name__)
 app.secret_key = "siwes2025"  # Needed for sessions
@@ -18,81 +25,260 @@ USERS = {
 app.config['UPLOAD_FOLDER'] = 'uploads/excel'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-ALLOWED_EXTENSIONS = {'xlsx'}
+ALLOWED_EXTENSIONS = ROSTER_EXTENSIONS
+
+# Largest bulk /verify request
+MAX_VERIFY_IDS = 100000
+
+# 🔥 Load fonts and decode every template once at startup so the first request
+# isn't slow (with gunicorn.conf.py's preload_app, once for all workers)
+preload(TEMPLATES.values())
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-# 🔐 Protect all routes except login
+# ⏱️ Request timing for /metrics
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_timing(response):
+    if 'request_start' in g:
+        metrics.observe("http_request_seconds", time.perf_counter() - g.request_start,
+                        endpoint=request.endpoint or "unknown", status=response.status_code)
+    return response
+
+
+# Reachable without logging in: the Prometheus scrape. /verify stays behind
+# the login: it returns the holder's details, and certificate IDs are usually
+# sequential, so a public lookup would let anyone list every holder.
+PUBLIC_ENDPOINTS = ('login', 'metrics_endpoint')
+
+
+# 🔐 Protect all routes except the public ones
 @app.before_request
 def require_login():
-    if 'username' not in session and request.endpoint != 'login':
+    if 'username' not in session and request.endpoint not in PUBLIC_ENDPOINTS:
         return redirect('/login')
 
 
+def wants_json():
+    return request.accept_mimetypes.best == "application/json"
+
+
+def upload_error(message):
+    if wants_json():
+        return jsonify({"error": message}), 400
+    flash(f"❌ {message}", "error")
+    return redirect("/")
+
+
+def save_upload():
+    """Validate the upload form and save the roster.
+
+    Returns (excel_path, template_path, options, None), or
+    (None, None, None, error_response) for the caller to return.
+    """
+    file = request.files.get('excel')
+    if file is None or file.filename == '':
+        return None, None, None, upload_error("No file selected.")
+    if not allowed_file(file.filename):
+        return None, None, None, upload_error("Please upload a valid .xlsx or .csv file.")
+
+    template_path = TEMPLATES.get(request.form.get('template'))
+    if not template_path:
+        return None, None, None, upload_error("Please select a template.")
+
+    layout = request.form.get('layout', 'long')
+    if layout not in PROFILES:
+        return None, None, None, upload_error("Please select a layout.")
+    options = dict(OUTPUT_OPTIONS.get(request.form.get('output'), {}))
+    options['layout'] = layout
+
+    # Unique upload name so concurrent jobs never share a roster file
+    filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    file.save(excel_path)
+
+    # Reject a malformed sheet now rather than after the job is queued
+    try:
+        check_roster(excel_path)
+    except Exception as e:
+        os.remove(excel_path)
+        return None, None, None, upload_error(f"Error: {e}")
+    return excel_path, template_path, options, None
+
+
+def start_job(excel_path, template_path, options):
+    # Render in the background; the client polls /jobs/<id>/status
+    job_id = submit_job(excel_path, template_path, options)
+    if wants_json():
+        return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}/status"}), 202
+    return redirect(f"/jobs/{job_id}")
+
+
 # 🖥️ Main Certificate Page (formerly /long)
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
-        if 'excel' not in request.files:
-            flash("❌ No file selected.")
-            return redirect(request.url)
-        file = request.files['excel']
-        if file.filename == '':
-            flash("❌ No file selected.")
-            return redirect(request.url)
-        if not allowed_file(file.filename):
-            flash("❌ Please upload a valid .xlsx file.")
-            return redirect(request.url)
-
-        filename = secure_filename(file.filename)
-        excel_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(excel_path)
-
-        template_key = request.form.get('template')
-        if template_key == 'template5':
-            template_path = 'static/Template5.jpeg'
-        elif template_key == 'template6':
-            template_path = 'static/Template6.jpeg'
-        elif template_key == 'template7':
-            template_path = 'static/Template7.jpg'
-        elif template_key == 'template8':
-            template_path = 'static/Template8.jpg'
-        else:
-            flash("❌ Please select a template.")
-            return redirect(request.url)
+        excel_path, template_path, options, error = save_upload()
+        if error:
+            return error
+        # ?profile=1 dumps a cProfile of this job's generation (see jobs.PROFILE_DIR)
+        if request.args.get('profile') == '1':
+            options['profile'] = True
+        return start_job(excel_path, template_path, options)
+
+    return render_template("long.html")
 
-        from generator_long import generate_certificates
-        result = generate_certificates(excel_path, template_path)
 
-        if result.get("error"):
-            flash(f"❌ Error: {result['error']}", "error")
-        else:
-            for err in result.get("errors", []):
-                flash(f"⚠️ {err}", "warning")
-
-        # Create ZIP to download
-        zip_buffer = io.BytesIO()
-        output_dir = os.path.join(os.getcwd(), "generated_certificates")
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for f in os.listdir(output_dir):
-                file_path = os.path.join(output_dir, f)
-                if os.path.isfile(file_path):
-                    zipf.write(file_path, f)
-        zip_buffer.seek(0)
-
-        count = len(result.get("generated", []))
-        flash(f"✅ Generated {count} certificates!", "success")
-        return send_file(
-            zip_buffer,
-            as_attachment=True,
-            download_name=f"certificates_{count}.zip",
-            mimetype="application/zip"
-        )
+# 🔍 Preview a few rows as thumbnails before committing to the full run
+@app.route("/preview", methods=["POST"])
+def preview():
+    try:
+        lines = parse_row_selection(request.form.get('rows'))
+    except ValueError as e:
+        return upload_error(str(e))
 
-    return render_template("long.html")
+    # A new preview replaces this session's unconfirmed one
+    discard_preview()
+    excel_path, template_path, options, error = save_upload()
+    if error:
+        return error
+    try:
+        previews = render_preview(excel_path, template_path, PROFILES[options['layout']], lines=lines)
+    except Exception as e:
+        os.remove(excel_path)
+        return upload_error(f"Preview failed: {e}")
+
+    # Recorded so the upload is cleaned up if the preview is never confirmed
+    preview_id = record_preview(excel_path)
+    session['preview'] = {"id": preview_id, "excel_path": excel_path, "template_path": template_path,
+                          "options": options}
+    for item in previews:
+        item["image"] = png_data_url(item.pop("png")) if item["png"] else None
+    if wants_json():
+        return jsonify({"previews": previews, "confirm_url": "/preview/confirm"})
+    return render_template("preview.html", previews=previews)
+
+
+@app.route("/preview/confirm", methods=["POST"])
+def confirm_preview():
+    pending = session.pop('preview', None)
+    if not pending or not claim_preview(pending.get("id")) or not os.path.exists(pending["excel_path"]):
+        return upload_error("Nothing to confirm; please upload the sheet again.")
+    return start_job(pending["excel_path"], pending["template_path"], pending["options"])
+
+
+def discard_preview():
+    pending = session.pop('preview', None)
+    if pending:
+        claim_preview(pending.get("id"))
+        try:
+            os.remove(pending["excel_path"])
+        except OSError:
+            pass
+
+
+# ⏳ Job progress page
+@app.route("/jobs/<job_id>")
+def job_page(job_id):
+    if get_job(job_id) is None:
+        abort(404)
+    return render_template("job.html", job_id=job_id)
+
+
+@app.route("/jobs/<job_id>/status")
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "rows_done": job["rows_done"],
+        "rows_total": job["rows_total"],
+        "errors": job["errors"],
+        "error": job["error"],
+        "generated": len(job["generated"]),
+        "eta_seconds": job["eta_seconds"],
+        "rendered": job["rendered"],
+        "reused": job["reused"],
+    })
+
+
+# 📦 Download a finished job as a streamed ZIP (constant memory)
+@app.route("/jobs/<job_id>/download")
+def job_download(job_id):
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+
+    generated = job["generated"]
+    count = len(generated)
+    return Response(
+        stream_with_context(_timed_zip(directory_entries(job["output_dir"], generated))),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=certificates_{count}.zip"}
+    )
+
+
+def _timed_zip(entries):
+    # The ZIP is built while the response streams, so it's timed here rather than in after_request
+    start = time.perf_counter()
+    size = 0
+    for chunk in stream_zip(entries):
+        size += len(chunk)
+        yield chunk
+    metrics.observe("zip_stream_seconds", time.perf_counter() - start)
+    metrics.inc("zip_stream_bytes_total", size)
+    metrics.flush()
+
+
+# ✅ Certificate verification
+@app.route("/verify/<path:cert_id>")
+def verify_certificate(cert_id):
+    record = lookup(cert_id)
+    if record is None:
+        return jsonify({"cert_id": cert_id, "valid": False}), 404
+    return jsonify({"valid": True, **record})
+
+
+# Bulk check: JSON {"ids": [...]} or a form/plain-text body with one ID per line
+@app.route("/verify", methods=["POST"])
+def verify_bulk():
+    if request.is_json:
+        ids = (request.get_json(silent=True) or {}).get("ids")
+        if not isinstance(ids, list):
+            return jsonify({"error": "Expected {\"ids\": [...]}"}), 400
+        ids = [str(cert_id).strip() for cert_id in ids]
+    else:
+        text = request.form.get("ids") if request.form else request.get_data(as_text=True)
+        ids = (text or "").splitlines()
+    ids = [cert_id.strip() for cert_id in ids if cert_id.strip()]
+    if len(ids) > MAX_VERIFY_IDS:
+        return jsonify({"error": f"At most {MAX_VERIFY_IDS} IDs per request"}), 400
+
+    records = lookup_many(ids)
+    missing = [cert_id for cert_id, record in records.items() if record is None]
+    return jsonify({
+        "checked": len(records),
+        "valid": len(records) - len(missing),
+        "missing": missing,
+        "results": records,
+    })
+
+
+# 📈 Prometheus metrics (stage timings, row histograms, counters)
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 
 # 🔐 Login Route
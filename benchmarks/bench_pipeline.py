@@ -0,0 +1,229 @@
+# benchmarks/bench_pipeline.py
+# Usage: python benchmarks/bench_pipeline.py [--sizes 10,1000,10000] [--output FILE] [--compare OLD.json]
+#                                          [--encodings pdf,jpeg,...]
+#
+# Times each stage of generator_long / generator_short on synthetic rosters
+# (Excel load, font load, template decode, layout, draw, encode, disk write,
+# ZIP) plus one end-to-end generate_certificates run, and writes the results
+# as JSON. encode/disk_write/zip use encoder.DEFAULT_ENCODING; every
+# encoding in --encodings is also timed as encode:<name> (with its output
+# size in bytes, and draw:<name> for draft encodings). Certificates are drawn,
+# encoded and written one at a time, with the per-row timings added up, so
+# memory stays flat whatever --render-rows is. With --compare, stages that got
+# slower than the tolerance are reported and the exit code is 1, so a release
+# check can catch regressions.
+from collections import defaultdict
+from contextlib import contextmanager
+import PIL
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # fonts/ and static/ are resolved relative to the repo root
+
+import generator_long  # noqa: E402
+import generator_short  # noqa: E402
+from encoder import ENCODINGS, downscale, encode, get_encoding  # noqa: E402
+from engine import draw_certificate, scale_placements  # noqa: E402
+from font_registry import clear_fonts  # noqa: E402
+from layout import clear_layout_cache  # noqa: E402
+from roster import open_roster  # noqa: E402
+from synthetic import write_roster  # noqa: E402
+from template_cache import clear_template_cache, get_template, get_preview_template  # noqa: E402
+from zip_stream import stream_zip  # noqa: E402
+
+GENERATORS = {"long": generator_long, "short": generator_short}
+TEMPLATE = "static/Template7.jpg"
+
+
+def record(results, name, seconds, rows=1):
+    results[name] = {
+        "seconds": round(seconds, 6),
+        "rows": rows,
+        "per_row_ms": round(seconds * 1000 / max(rows, 1), 4),
+    }
+
+
+@contextmanager
+def timed(results, name, rows=1):
+    start = time.perf_counter()
+    yield
+    record(results, name, time.perf_counter() - start, rows)
+
+
+@contextmanager
+def add_time(spent, name):
+    """Add the time spent in the block to spent[name] (per-row stages)."""
+    start = time.perf_counter()
+    yield
+    spent[name] += time.perf_counter() - start
+
+
+def bench_encoding(spent, sizes, encoding, template, writeup, stamps, cert):
+    """Time one encoding on one drawn certificate (drawing it again for draft ones)."""
+    if encoding.draft and encoding.scale != 1:
+        small = get_preview_template(TEMPLATE, encoding.scale)
+        sx, sy = small.width / template.width, small.height / template.height
+        with add_time(spent, f"draw:{encoding.name}"):
+            cert = draw_certificate(small, scale_placements(writeup, sx, sy), scale_placements(stamps, sx, sy))
+    buffer = io.BytesIO()
+    with add_time(spent, f"encode:{encoding.name}"):
+        encode(cert if encoding.draft else downscale(cert, encoding.scale), encoding, buffer)
+    sizes[f"encode:{encoding.name}"] += buffer.tell()
+
+
+def bench_generator(gen, roster_path, render_rows, workers, out_dir, encodings):
+    stages = {}
+    clear_template_cache()
+    clear_layout_cache()
+    clear_fonts()
+
+    start = time.perf_counter()
+    rows = list(open_roster(roster_path)[0])
+    record(stages, "excel_load", time.perf_counter() - start, len(rows))
+    sample = rows[:render_rows]
+
+    with timed(stages, "font_load"):
+        fonts = gen.load_fonts()
+    with timed(stages, "template_decode"):
+        template = get_template(TEMPLATE)
+
+    with timed(stages, "layout", len(sample)):
+        layouts = [gen.layout_certificate(row, fonts, template.width) for row in sample]
+
+    # One certificate at a time: keeping them all would need ~11 MiB each
+    default = get_encoding()
+    spent = defaultdict(float)
+    sizes = defaultdict(int)
+    paths = []
+    for writeup, stamps, _ in layouts:
+        if writeup is None:
+            continue
+        with add_time(spent, "draw"):
+            cert = draw_certificate(template, writeup, stamps)
+        buffer = io.BytesIO()
+        with add_time(spent, "encode"):
+            encode(downscale(cert, default.scale), default, buffer)
+        path = os.path.join(out_dir, f"{len(paths):06d}{default.extension}")
+        with add_time(spent, "disk_write"):
+            with open(path, "wb") as f:
+                f.write(buffer.getbuffer())
+        sizes["disk_write"] += buffer.tell()
+        paths.append(path)
+        for name in encodings:
+            bench_encoding(spent, sizes, ENCODINGS[name], template, writeup, stamps, cert)
+        del cert, buffer
+
+    record(stages, "draw", spent["draw"], len(sample))
+    for name in ["encode", "disk_write"] + [
+        stage for encoding in encodings for stage in (f"draw:{encoding}", f"encode:{encoding}")
+    ]:
+        if name in spent:
+            record(stages, name, spent[name], len(paths))
+        if name in sizes:
+            stages[name]["bytes"] = sizes[name]
+
+    zipped = 0
+    with timed(stages, "zip", len(paths)):
+        for chunk in stream_zip((path, os.path.basename(path)) for path in paths):
+            zipped += len(chunk)
+    stages["zip"]["bytes"] = zipped
+
+    with timed(stages, "end_to_end", len(rows)):
+        # use_store=False: a repeat run would otherwise time store hits, not rendering;
+        # record_issued=False: keep synthetic rows out of the real verify index
+        result = gen.generate_certificates(roster_path, TEMPLATE, workers=workers,
+                                           output_dir=os.path.join(out_dir, "e2e"), use_store=False,
+                                           record_issued=False)
+    stages["end_to_end"]["generated"] = len(result.get("generated", []))
+    return stages
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {(r["generator"], r["rows"]): r["stages"] for r in json.load(f)["results"]}
+    regressions = []
+    for run in results:
+        old_stages = baseline.get((run["generator"], run["rows"]), {})
+        for stage, new in run["stages"].items():
+            old = old_stages.get(stage)
+            if not old or not old["per_row_ms"]:
+                continue
+            ratio = new["per_row_ms"] / old["per_row_ms"]
+            flag = "❌" if ratio > 1 + tolerance else "  "
+            print(f"{flag} {run['generator']:<5} rows={run['rows']:<6} {stage:<16} "
+                  f"{old['per_row_ms']:>10.3f} -> {new['per_row_ms']:>10.3f} ms/row ({ratio:.2f}x)")
+            if ratio > 1 + tolerance:
+                regressions.append((run["generator"], run["rows"], stage, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the certificate pipeline stage by stage.")
+    parser.add_argument("--sizes", default="10,1000,10000", help="comma-separated roster sizes")
+    parser.add_argument("--generators", default="long,short")
+    parser.add_argument("--render-rows", type=int, default=1000,
+                        help="rows per size used for the layout/draw/encode/write/zip stages")
+    parser.add_argument("--workers", type=int, default=None, help="workers for the end-to-end run")
+    parser.add_argument("--encodings", default=",".join(ENCODINGS),
+                        help="encoder.ENCODINGS to time on the same certificates (empty for none)")
+    parser.add_argument("--output", default=None, help="JSON file (default bench_results/pipeline-<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+    encodings = [name for name in args.encodings.split(",") if name]
+    unknown = [name for name in encodings if name not in ENCODINGS]
+    if unknown:
+        parser.error(f"unknown encodings: {', '.join(unknown)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            roster = write_roster(os.path.join(tmp, f"roster_{size}.xlsx"), size)
+            for key in args.generators.split(","):
+                out_dir = tempfile.mkdtemp(dir=tmp)
+                stages = bench_generator(GENERATORS[key], roster, args.render_rows, args.workers, out_dir, encodings)
+                results.append({"generator": key, "rows": size, "stages": stages})
+                summary = ", ".join(f"{name}={s['seconds']:.3f}s" for name, s in stages.items())
+                print(f"📊 {key} rows={size}: {summary}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "cpus": os.cpu_count(),
+            "render_rows": args.render_rows,
+            "default_encoding": get_encoding()._asdict(),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(ROOT, "bench_results", f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}", file=sys.stderr)
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# benchmarks/parallel_speedup.py
+# Usage: python benchmarks/parallel_speedup.py [rows] [max_workers]
+#
+# Renders a synthetic roster with 1, 2, 4, ... workers and prints the
+# speedup over the single-process run. Timings go to stderr so the
+# per-certificate "Saved" lines can be silenced with >/dev/null.
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # fonts/ and static/ are resolved relative to the repo root
+
+import generator_long  # noqa: E402
+from synthetic import write_roster  # noqa: E402
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        roster = os.path.join(tmp, "roster.xlsx")
+        write_roster(roster, rows)
+
+        baseline = None
+        workers = 1
+        while workers <= max_workers:
+            start = time.perf_counter()
+            # use_store=False: later runs would otherwise just link the first run's files;
+            # record_issued=False: keep synthetic rows out of the real verify index
+            result = generator_long.generate_certificates(roster, "static/Template7.jpg", workers=workers,
+                                                          use_store=False, record_issued=False)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"workers={workers:<2} rows={len(result.get('generated', []))} "
+                  f"time={elapsed:.2f}s speedup={baseline / elapsed:.2f}x", file=sys.stderr)
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
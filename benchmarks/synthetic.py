@@ -0,0 +1,57 @@
+# benchmarks/synthetic.py
+# Synthetic rosters for the benchmarks: a realistic mix of date formats,
+# write-ups, courses and (sometimes very) long names.
+from openpyxl import Workbook
+from datetime import datetime
+import random
+
+FIRST_NAMES = ["Ada", "Chinedu", "Oluwaseun", "Ngozi", "Ibrahim", "Aisha", "Emeka", "Funmilayo",
+               "Tunde", "Zainab", "Chukwuemeka", "Adaeze", "Babatunde", "Oluwatobiloba"]
+LAST_NAMES = ["Okafor", "Adeyemi", "Balogun", "Eze", "Mohammed", "Olawale", "Nwachukwu",
+              "Ogunleye", "Abubakar", "Onyekachukwu-Adebayo", "Oyelaran-Oyeyinka"]
+COURSES = ["Data Analysis", "Health Care", "Web Development", "Digital Marketing",
+           "Project Management", "Cyber Security Fundamentals"]
+WRITEUPS = [
+    "has successfully completed the {course} course on {date}.",
+    "has successfully completed the {Course} training programme held on {Date} and has demonstrated "
+    "the skills and knowledge required of a practitioner in the field.",
+    "for outstanding participation in the {course} course, completed on {date}, under the SIWES "
+    "industrial training scheme in partnership with SkillBoost Limited.",
+    "",  # empty write-ups fall back to the default sentence
+]
+
+
+def _date(rng, i):
+    day = datetime(2025, 1 + i % 12, 1 + rng.randrange(28))
+    kind = i % 3
+    if kind == 0:
+        return day
+    if kind == 1:
+        return day.strftime("%d/%m/%Y")
+    # Excel serial date
+    return (day - datetime(1899, 12, 30)).days
+
+
+def roster_rows(rows, seed=2025):
+    rng = random.Random(seed)
+    for i in range(rows):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        if i % 10 == 0:
+            name = f"{rng.choice(FIRST_NAMES)} {name} {rng.choice(LAST_NAMES)}"
+        yield [
+            name,
+            _date(rng, i),
+            rng.choice(WRITEUPS),
+            f"SIWES/{2025}/{i:06d}",
+            rng.choice(COURSES),
+        ]
+
+
+def write_roster(path, rows, seed=2025):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Name", "Date", "Write-up", "Certificate ID", "Course"])
+    for row in roster_rows(rows, seed):
+        ws.append(row)
+    wb.save(path)
+    return path
@@ -0,0 +1,123 @@
+# cert_store.py
+from font_registry import font_bytes
+import contextlib
+import hashlib
+import os
+import shutil
+import threading
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Finished certificates, filed under a hash of everything that went into them
+# (row, template file, layout profile, font files, output format). A
+# re-uploaded roster only renders the rows that changed.
+CERT_STORE_DIR = os.environ.get("CERT_STORE_DIR", os.path.join(BASE_DIR, "cert_store"))
+# Least recently used entries are evicted past this size; 0 disables the store
+CERT_STORE_MAX_BYTES = int(os.environ.get("CERT_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+# Bump when a code change alters rendered output, so old entries stop matching
+STORE_VERSION = 1
+
+_contexts = {}  # (template path, mtime, profile, output format) -> digest
+_lock = threading.Lock()
+
+
+def enabled():
+    return CERT_STORE_MAX_BYTES > 0
+
+
+def _file_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def context_digest(template_path, profile, output_format):
+    """Digest of the inputs shared by every row of a batch, memoized per process."""
+    path = os.path.abspath(template_path)
+    key = (path, os.path.getmtime(path), profile, output_format)
+    digest = _contexts.get(key)
+    if digest is None:
+        h = hashlib.sha256(f"v{STORE_VERSION}|{profile!r}|{output_format}".encode())
+        with open(path, "rb") as f:
+            h.update(_file_digest(f.read()).encode())
+        for font_path in sorted({profile.font_regular, profile.font_bold}):
+            h.update(_file_digest(font_bytes(font_path)).encode())
+        digest = h.hexdigest()
+        with _lock:
+            _contexts[key] = digest
+    return digest
+
+
+def row_key(context, row):
+    # row.line (position in the sheet) doesn't affect the certificate
+    fields = (row.name, row.date, row.writeup, row.cert_id, row.course)
+    return hashlib.sha256("\x1f".join([context, *map(str, fields)]).encode()).hexdigest()
+
+
+def _store_path(key):
+    return os.path.join(CERT_STORE_DIR, key[:2], key + ".pdf")
+
+
+def _link(source, target):
+    # Hard links share one copy on disk; fall back to copying across devices
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    try:
+        os.replace(tmp, target)
+    finally:
+        # rename() does nothing if target is already a link to the same file
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+
+
+def fetch(key, output_path):
+    """Put the stored certificate for key at output_path; False if there is none."""
+    path = _store_path(key)
+    try:
+        _link(path, output_path)
+        os.utime(path)  # mark as recently used for evict()
+    except OSError:
+        return False
+    return True
+
+
+def put(key, output_path):
+    path = _store_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _link(output_path, path)
+    except OSError as e:
+        print(f"❌ Certificate store write failed: {e}")
+
+
+def evict(max_bytes=None):
+    """Delete least recently used entries until the store is under max_bytes."""
+    max_bytes = CERT_STORE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(CERT_STORE_DIR):
+        return 0
+    entries = []
+    total = 0
+    for shard in os.scandir(CERT_STORE_DIR):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    removed = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        print(f"🧹 Certificate store: evicted {removed} entries")
+    return removed
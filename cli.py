@@ -0,0 +1,257 @@
+# cli.py
+"""Render certificate batches from the command line, for large or scheduled runs.
+
+    python cli.py rosters/ --template template5 --output out --workers 8
+
+Each roster (.xlsx or .csv; a directory is searched for both) renders into
+its own folder under --output, named after the file without its extension
+(so a.xlsx and a.csv in one run are refused). Certificates already in
+that folder are kept, so re-running after an interruption only renders what
+is missing; --force renders everything again.
+
+Exit codes, for cron and CI:
+    0   every roster rendered without row errors
+    1   finished, but some rows had errors (see the report)
+    2   bad arguments
+    3   at least one roster could not be rendered at all
+    4   another run is already writing to the output directory
+    130 interrupted
+"""
+import argparse
+import fcntl
+import glob
+import os
+import sys
+import time
+
+# Per-certificate "Saved" lines would drown out the progress line
+os.environ.setdefault("LOG_SAVES", "0")
+
+from encoder import get_encoding  # noqa: E402
+from engine import (OUTPUT_OPTIONS, PRINT_PDF_NAME, PROFILES, SINGLE_PDF_NAME, TEMPLATES,  # noqa: E402
+                    generate_certificates, preload)
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+ROSTER_EXTENSIONS = (".xlsx", ".csv")
+LOCK_NAME = ".cli.lock"
+# Seconds between progress lines when stderr is not a terminal (cron logs)
+LOG_INTERVAL = 10
+
+EXIT_OK = 0
+EXIT_ROW_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+EXIT_LOCKED = 4
+EXIT_INTERRUPTED = 130
+
+
+def roster_folder(roster):
+    """The sub-folder of --output a roster renders into."""
+    return os.path.splitext(os.path.basename(roster))[0]
+
+
+def find_rosters(paths):
+    """Expand files and directories into a sorted list of roster files.
+
+    Raises ValueError if two rosters would render into the same folder.
+    """
+    rosters = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = [
+                f for ext in ROSTER_EXTENSIONS for f in glob.glob(os.path.join(path, "*" + ext))
+                # Skip the lock files Excel leaves next to open workbooks
+                if not os.path.basename(f).startswith("~$")
+            ]
+            rosters.extend(sorted(found))
+        elif os.path.isfile(path) and path.lower().endswith(ROSTER_EXTENSIONS):
+            rosters.append(path)
+        else:
+            raise ValueError(f"{path} is not a .xlsx/.csv roster or a directory")
+
+    # Compared case-insensitively, as some filesystems do
+    folders = {}
+    for roster in rosters:
+        other = folders.setdefault(roster_folder(roster).lower(), roster)
+        if other != roster:
+            raise ValueError(f"{other} and {roster} would both render into {roster_folder(roster)}/; rename one")
+    return rosters
+
+
+def resolve_template(value):
+    """A TEMPLATES key or a path to an image file."""
+    if value in TEMPLATES:
+        return TEMPLATES[value]
+    if os.path.isfile(value):
+        return value
+    raise ValueError(f"Unknown template {value!r} (choose from {', '.join(TEMPLATES)} or give an image path)")
+
+
+def combined_name(options):
+    """The one output file for single-PDF and print-sheet formats, else None."""
+    if options.get("print_sheet"):
+        return PRINT_PDF_NAME.format(sheet=options["print_sheet"])
+    if options.get("single_pdf"):
+        return SINGLE_PDF_NAME
+    return None
+
+
+class Progress:
+    """One updating stderr line on a terminal, a line every LOG_INTERVAL seconds otherwise."""
+
+    def __init__(self, label, stream=sys.stderr):
+        self.label = label
+        self.stream = stream
+        self.tty = stream.isatty()
+        self.start = time.monotonic()
+        self.last = 0.0
+        self.last_done = None
+
+    def __call__(self, done, total, errors):
+        now = time.monotonic()
+        if done == self.last_done or (now - self.last < (0.2 if self.tty else LOG_INTERVAL) and done < total):
+            return
+        self.last = now
+        self.last_done = done
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        line = f"{self.label}: {done}/{total or '?'} rows, {rate:.1f}/s"
+        if errors:
+            line += f", {len(errors)} errors"
+        if rate and total > done:
+            line += f", ~{(total - done) / rate:.0f}s left"
+        if self.tty:
+            self.stream.write("\r\033[K" + line)
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def finish(self):
+        if self.tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+def render_roster(roster, template_path, layout, output_dir, workers, options, force):
+    """Render one roster into output_dir; returns the engine result dict.
+
+    If the single-PDF or print file is already there, nothing is rendered and
+    the result has "kept": True instead of row counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    single = combined_name(options)
+    if single and not force and os.path.exists(os.path.join(output_dir, single)):
+        return {"success": True, "generated": [single], "errors": [], "rendered": 0, "reused": 0, "kept": True}
+    # Left behind by a run that was killed mid-write
+    for part in glob.glob(os.path.join(output_dir, "*.part")):
+        os.remove(part)
+
+    progress = Progress(os.path.basename(roster))
+    try:
+        return generate_certificates(
+            roster, template_path, PROFILES[layout], workers=workers, progress=progress,
+            output_dir=output_dir, skip_existing=not force, use_store=not force, **options
+        )
+    finally:
+        progress.finish()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Render certificates for one or more rosters without the web app.",
+        epilog="Exit codes: 0 ok, 1 row errors, 2 bad arguments, 3 a roster failed, 4 output locked, 130 interrupted.",
+    )
+    parser.add_argument("inputs", nargs="+", help="roster files (.xlsx/.csv) or directories of them")
+    parser.add_argument("-t", "--template", required=True,
+                        help=f"template key ({', '.join(TEMPLATES)}) or path to a template image")
+    parser.add_argument("-o", "--output", required=True, help="output directory (one sub-folder per roster)")
+    parser.add_argument("-l", "--layout", choices=sorted(PROFILES), default="long")
+    parser.add_argument("-f", "--format", choices=list(OUTPUT_OPTIONS), default="raster")
+    parser.add_argument("-q", "--quality", type=int, default=None,
+                        help="JPEG quality 1-100 for image PDFs, JPEG and WebP (overrides the format's preset)")
+    parser.add_argument("--scale", type=float, default=None, help="shrink images/image PDFs, e.g. 0.5")
+    parser.add_argument("--draft", action="store_true",
+                        help="with --scale, draw onto a reduced-size template decode (faster, slightly softer)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="render processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="render every certificate again, ignoring existing files and the certificate store")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        rosters = find_rosters(args.inputs)
+        template_path = resolve_template(args.template)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if not rosters:
+        print("❌ No .xlsx or .csv rosters found", file=sys.stderr)
+        return EXIT_USAGE
+    if args.workers is not None and args.workers < 1:
+        print("❌ --workers must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    options = dict(OUTPUT_OPTIONS[args.format])
+    if args.quality is not None or args.scale is not None or args.draft:
+        try:
+            options["encoding"] = get_encoding(options.get("encoding"), args.quality, args.scale,
+                                               args.draft or None)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    os.makedirs(args.output, exist_ok=True)
+    lock = open(os.path.join(args.output, LOCK_NAME), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"❌ Another run is writing to {args.output}", file=sys.stderr)
+        lock.close()
+        return EXIT_LOCKED
+
+    preload([template_path], [PROFILES[args.layout]])
+    exit_code = EXIT_OK
+    start = time.monotonic()
+    totals = {"rendered": 0, "reused": 0, "errors": 0, "kept": 0}
+    try:
+        for roster in rosters:
+            output_dir = os.path.join(args.output, roster_folder(roster))
+            result = render_roster(roster, template_path, args.layout, output_dir, args.workers, options,
+                                   args.force)
+            if "error" in result:
+                print(f"❌ {roster}: {result['error']}", file=sys.stderr)
+                exit_code = EXIT_FAILED
+                continue
+            if result.get("kept"):
+                totals["kept"] += 1
+                print(f"✅ {roster} -> {output_dir}: {result['generated'][0]} already there, not re-rendered "
+                      f"(--force to redo it)")
+                continue
+            for err in result["errors"]:
+                print(f"⚠️ {roster}: {err}", file=sys.stderr)
+            totals["rendered"] += result["rendered"]
+            totals["reused"] += result["reused"]
+            totals["errors"] += len(result["errors"])
+            if result["errors"] and exit_code == EXIT_OK:
+                exit_code = EXIT_ROW_ERRORS
+            print(f"✅ {roster} -> {output_dir}: {result['rendered']} rendered, "
+                  f"{result['reused']} reused, {len(result['errors'])} errors")
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted; run again to pick up where this left off", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    finally:
+        lock.close()
+
+    summary = (f"🏁 {len(rosters)} rosters in {time.monotonic() - start:.1f}s: {totals['rendered']} rendered, "
+               f"{totals['reused']} reused, {totals['errors']} errors")
+    if totals["kept"]:
+        summary += f", existing PDFs kept for {totals['kept']} of them"
+    print(summary)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# encoder.py
+from PIL import Image
+from collections import namedtuple
+from pdf_vector import PDF_DPI
+import os
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# How a rendered certificate image is written out. quality is the JPEG
+# quality for PDF (Pillow embeds the page as a JPEG), JPEG and WebP; scale
+# shrinks the output (0.5 = half width and height); draft renders straight
+# onto a reduced-size JPEG decode of the template with scaled fonts instead
+# of drawing at full size and shrinking afterwards - faster, slightly softer.
+Encoding = namedtuple("Encoding", "name format extension quality scale draft")
+
+# Per certificate on the 2000x1414 bundled templates (benchmarks/bench_pipeline.py):
+#   PDF q75 (the old fixed output)  15 ms  251 KiB
+#   PDF q60                         14 ms  200 KiB
+#   PDF q60, half size              10 ms   58 KiB
+#   PNG level 1                    235 ms 1719 KiB
+#   WebP q75 method 2              150 ms  104 KiB
+# q60 keeps text edges clean (~39 dB PSNR against the unencoded page), so it
+# is the default; pdf-print keeps more detail for print shops.
+ENCODINGS = {
+    "pdf": Encoding("pdf", "PDF", ".pdf", 60, 1.0, False),
+    "pdf-print": Encoding("pdf-print", "PDF", ".pdf", 85, 1.0, False),
+    "jpeg": Encoding("jpeg", "JPEG", ".jpg", 75, 1.0, False),
+    "jpeg-web": Encoding("jpeg-web", "JPEG", ".jpg", 70, 0.5, True),
+    "png": Encoding("png", "PNG", ".png", None, 1.0, False),
+    "webp": Encoding("webp", "WEBP", ".webp", 75, 1.0, False),
+}
+DEFAULT_ENCODING = os.environ.get("CERT_ENCODING", "pdf")
+# zlib level for PNG: level 6 is only ~15% smaller than 1 but 2.5x slower
+PNG_COMPRESS_LEVEL = 1
+# libwebp effort, 0 (fastest) to 6; 4 is ~2.5x slower than 2 for ~20% less
+WEBP_METHOD = 2
+
+
+def get_encoding(encoding=None, quality=None, scale=None, draft=None):
+    """Return an Encoding from an ENCODINGS name (or an Encoding), with overrides.
+
+    Raises ValueError for an unknown name or an out-of-range override.
+    """
+    if not isinstance(encoding, Encoding):
+        if (encoding or DEFAULT_ENCODING) not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        encoding = ENCODINGS[encoding or DEFAULT_ENCODING]
+    if quality is not None:
+        if not 1 <= quality <= 100:
+            raise ValueError(f"Quality must be 1-100, got {quality}")
+        encoding = encoding._replace(quality=quality)
+    if scale is not None:
+        if not 0 < scale <= 1:
+            raise ValueError(f"Scale must be above 0 and at most 1, got {scale}")
+        encoding = encoding._replace(scale=scale)
+    if draft is not None:
+        encoding = encoding._replace(draft=draft)
+    return encoding
+
+
+def downscale(image, scale):
+    """Shrink a full-size certificate by scale (whole-number ratios use the fast reduce())."""
+    if scale == 1:
+        return image
+    factor = 1 / scale
+    if abs(factor - round(factor)) < 1e-6:
+        return image.reduce(round(factor))
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def encode(image, encoding, out):
+    """Write an RGB certificate image to the file object out.
+
+    image is already at output size (see downscale); PDFs keep the same
+    page size whatever the scale, by lowering the resolution with it.
+    """
+    if encoding.format == "PDF":
+        image.save(out, "PDF", resolution=PDF_DPI * encoding.scale, quality=encoding.quality)
+    elif encoding.format == "JPEG":
+        image.save(out, "JPEG", quality=encoding.quality)
+    elif encoding.format == "PNG":
+        image.save(out, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    elif encoding.format == "WEBP":
+        image.save(out, "WEBP", quality=encoding.quality, method=WEBP_METHOD)
+    else:
+        raise ValueError(f"Unsupported format: {encoding.format}")
@@ -0,0 +1,554 @@
+# engine.py
+from PIL import Image, ImageDraw
+from collections import namedtuple
+from encoder import get_encoding, downscale, encode
+from font_registry import get_font, fit_font
+from layout import layout_paragraph, take_layout_stats, add_layout_stats
+from naming import certificate_filename, plan_names
+from pdf_vector import VectorPdf, PRINT_SHEETS
+from render_pool import render_chunks, chunk_rows, RENDER_CHUNK_SIZE
+from roster import open_roster
+from template_cache import get_template, get_preview_template, get_paragraph_layer, preload_templates
+from verify_index import IssuedRecorder
+import cert_store
+import metrics
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Each run writes into its own folder under OUTPUT_DIR (see generate_certificates)
+OUTPUT_DIR = os.path.join(os.getcwd(), "generated_certificates")
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Batch file name when generate_certificates(..., single_pdf=True)
+SINGLE_PDF_NAME = "certificates.pdf"
+# ... and with print_sheet=<PRINT_SHEETS key>
+PRINT_PDF_NAME = "print_{sheet}.pdf"
+# Print a line per saved certificate (the CLI turns this off)
+LOG_SAVES = os.environ.get("LOG_SAVES", "1") != "0"
+
+# Bundled certificate backgrounds, by the key the upload form and CLI use
+TEMPLATES = {
+    'template5': os.path.join(BASE_DIR, 'static/Template5.jpeg'),
+    'template6': os.path.join(BASE_DIR, 'static/Template6.jpeg'),
+    'template7': os.path.join(BASE_DIR, 'static/Template7.jpg'),
+    'template8': os.path.join(BASE_DIR, 'static/Template8.jpg'),
+}
+
+# Output choices (upload form / CLI --format) -> generate_certificates options
+OUTPUT_OPTIONS = {
+    'raster': {},
+    'vector': {'output_format': 'vector'},
+    'single': {'output_format': 'vector', 'single_pdf': True},
+    'print-a4': {'print_sheet': 'a4'},
+    'print-a4-2up': {'print_sheet': 'a4-2up'},
+    'print-a3-4up': {'print_sheet': 'a3-4up'},
+    'jpeg': {'encoding': 'jpeg'},
+    'jpeg-web': {'encoding': 'jpeg-web'},
+    'png': {'encoding': 'png'},
+    'webp': {'encoding': 'webp'},
+}
+
+# -----------------------------
+# Layout profiles
+# -----------------------------
+# Everything that differs between certificate styles. name_center_x None
+# centres the name on the template; otherwise the name is placed around
+# that x (the short layout's templates have the name box off-centre).
+# Names wider than name_max_width are shrunk towards name_min_font_size
+# (see font_registry.fit_font). clean_punctuation swaps typographic
+# quotes/dashes for plain ones. Font paths are relative to the package.
+LayoutProfile = namedtuple("LayoutProfile", [
+    "name", "font_regular", "font_bold", "name_font_bold",
+    "name_font_size", "paragraph_font_size", "id_font_size",
+    "name_y", "writeup_start_y", "cert_id_position", "max_text_width",
+    "line_gap", "name_center_x", "clean_punctuation",
+    "name_max_width", "name_min_font_size",
+])
+
+# Cormorant Garamond fonts (downloaded into fonts/ folder)
+LONG = LayoutProfile(
+    name="long",
+    font_regular="fonts/CormorantGaramond-Regular.ttf",
+    font_bold="fonts/CormorantGaramond-SemiBold.ttf",  # or Bold.ttf if you prefer stronger
+    name_font_bold=True,
+    name_font_size=130,
+    paragraph_font_size=39,
+    id_font_size=30,
+    name_y=665,
+    writeup_start_y=820,
+    cert_id_position=(900, 1274),
+    max_text_width=1600,
+    line_gap=4,
+    name_center_x=None,
+    clean_punctuation=False,
+    name_max_width=1700,
+    name_min_font_size=56,
+)
+
+# Bundled Arial (works everywhere); there is no separate bold file, so bold
+# phrases use the same face
+SHORT = LayoutProfile(
+    name="short",
+    font_regular="fonts/arial.ttf",
+    font_bold="fonts/arial.ttf",
+    name_font_bold=False,
+    name_font_size=100,
+    paragraph_font_size=40,
+    id_font_size=30,
+    name_y=675,
+    writeup_start_y=830,
+    cert_id_position=(900, 1274),
+    max_text_width=1600,
+    line_gap=10,
+    name_center_x=960,
+    clean_punctuation=True,
+    name_max_width=1700,
+    name_min_font_size=48,
+)
+
+PROFILES = {profile.name: profile for profile in (LONG, SHORT)}
+
+# What render_certificate reports for each row. output_hash is the SHA-256
+# of the PDF (None for pages of a single combined PDF).
+RenderResult = namedtuple("RenderResult", "row filename errors reused output_hash")
+
+PUNCTUATION = str.maketrans({"“": "\"", "”": "\"", "’": "'", "‐": "-", "–": "-", "—": "-", "\u200e": None})
+
+
+# -----------------------------
+# Fonts (memoized per process in font_registry; gunicorn workers inherit them,
+# render pool workers load their own in _init_worker)
+# -----------------------------
+def load_fonts(profile):
+    return {
+        "name": get_font(profile.font_bold if profile.name_font_bold else profile.font_regular,
+                         profile.name_font_size),
+        "paragraph": get_font(profile.font_regular, profile.paragraph_font_size),
+        "bold_paragraph": get_font(profile.font_bold, profile.paragraph_font_size),
+        "id": get_font(profile.font_regular, profile.id_font_size),
+    }
+
+
+def preload(template_paths, profiles=None):
+    """Load fonts for every profile and decode the templates.
+
+    Called when app.py is imported, so with gunicorn's preload_app the
+    master does this once and every forked worker starts warm.
+    """
+    for profile in profiles or PROFILES.values():
+        load_fonts(profile)
+        print(f"✅ Fonts loaded: {profile.name}")
+    preload_templates(template_paths)
+
+
+# -----------------------------
+# Layout and drawing
+# -----------------------------
+def writeup_text(row, profile):
+    """Fill the row's write-up template; returns (text, error or None)."""
+    default = f"has successfully completed the {row.course} course on {row.date}."
+    text = row.writeup
+    if not text:
+        return default, None
+    if profile.clean_punctuation:
+        text = text.translate(PUNCTUATION)
+    text = text.replace("{Course}", "{course}").replace("{Date}", "{date}")
+    try:
+        text = text.format(course=row.course, date=row.date)
+    except Exception as e:
+        return default, f"Write-up format error for {row.name}: {e}"
+    return re.sub(r'\s+([.,:;!?])', r'\1', text), None
+
+
+def layout_certificate(row, profile, fonts, canvas_width):
+    """Work out where every piece of text goes for one roster.RosterRow.
+
+    Returns (writeup, stamps, errors), placements being (x, y, text, font) in
+    template pixels: writeup is the paragraph (shared by rows with the same
+    text), stamps the per-row name and certificate ID. writeup is None when
+    the row can't be laid out. Both output engines draw from this.
+    """
+    errors = []
+    if row.date_error:
+        errors.append(f"Date error for {row.name}: {row.date_error}")
+
+    full_text, error = writeup_text(row, profile)
+    if error:
+        errors.append(error)
+
+    # Wrap Write-up (laid out once per distinct paragraph, see layout)
+    paragraph_font = fonts["paragraph"]
+    line_height = paragraph_font.getbbox("Ay")[3] + profile.line_gap
+    writeup = layout_paragraph(
+        full_text, [row.course, row.date], paragraph_font, fonts["bold_paragraph"],
+        profile.max_text_width, canvas_width, profile.writeup_start_y, line_height
+    )
+
+    # Place Name (long names shrink to fit, keeping the same baseline)
+    name = str(row.name)
+    try:
+        name_font = fit_font(fonts["name"].path, fonts["name"].size, name,
+                             profile.name_max_width, profile.name_min_font_size)
+        name_y = profile.name_y + fonts["name"].getmetrics()[0] - name_font.getmetrics()[0]
+        name_bbox = name_font.getbbox(name)
+        name_width = name_bbox[2] - name_bbox[0]
+        if profile.name_center_x is None:
+            name_x = (canvas_width - name_width) // 2
+        else:
+            name_x = profile.name_center_x - name_width // 2.3
+    except Exception as e:
+        errors.append(f"Name draw error for {name}: {e}")
+        return None, None, errors
+
+    stamps = (
+        (name_x, name_y, name, name_font),
+        (*profile.cert_id_position, f"Certificate ID: {row.cert_id}", fonts["id"]),
+    )
+    return writeup, stamps, errors
+
+
+def draw_placements(draw, placements):
+    for x, y, text, font in placements:
+        draw.text((x, y), text, font=font, fill="black")
+
+
+def scale_placements(placements, sx, sy):
+    """Placements for a template resized by (sx, sy), with fonts scaled to match."""
+    return tuple(
+        (x * sx, y * sy, text, get_font(font.path, max(1, round(font.size * sy))))
+        for x, y, text, font in placements
+    )
+
+
+# One page-sized image per thread that render_certificate draws every row into
+_scratch = threading.local()
+
+
+def _scratch_page(source):
+    page = getattr(_scratch, "page", None)
+    if page is None or page.size != source.size or page.mode != source.mode:
+        page = _scratch.page = Image.new(source.mode, source.size)
+    page.paste(source)
+    return page
+
+
+def draw_certificate(template_image, writeup, stamps, reuse=False):
+    """Return template_image with the write-up and stamps drawn on.
+
+    The result is a fresh copy, or with reuse=True this thread's scratch
+    page: no page-sized allocation per row, but the next reuse=True call
+    draws over it, so it must be encoded before then.
+    """
+    # Rows sharing a paragraph start from a template with it already drawn on
+    layer = get_paragraph_layer(template_image, writeup, lambda draw: draw_placements(draw, writeup))
+    source = layer if layer is not None else template_image
+    cert = _scratch_page(source) if reuse else source.copy()
+    draw = ImageDraw.Draw(cert)
+    if layer is None:
+        draw_placements(draw, writeup)
+    draw_placements(draw, stamps)
+    return cert
+
+
+def render_certificate(row, profile, template_path, fonts, output_dir, output_format="raster", use_store=True,
+                       output_filename=None, skip_existing=False, encoding=None):
+    """Render and save one roster.RosterRow as its own PDF (or image).
+
+    output_format is "raster" (text drawn onto the template image, written
+    as set by encoding: an encoder.ENCODINGS name or Encoding, default
+    encoder.DEFAULT_ENCODING) or "vector" (template JPEG embedded as-is,
+    text as real PDF text). Returns
+    a RenderResult; its filename is None when the row fails, reused is True
+    when an identical certificate came from cert_store instead of being
+    rendered. output_filename defaults to
+    naming.certificate_filename(row); batches pass the unique names from
+    naming.plan_names. With skip_existing, a file already at the output path
+    (from an interrupted run; files only appear once complete) is kept and
+    counted as reused. Stage and per-row timings are recorded for /metrics
+    (see metrics).
+    """
+    row_start = time.perf_counter()
+    with metrics.stage("template_load"):
+        template_image = get_template(template_path)
+    with metrics.stage("layout"):
+        writeup, stamps, errors = layout_certificate(row, profile, fonts, template_image.width)
+    if writeup is None:
+        return RenderResult(row, None, errors, False, None)
+
+    encoding = get_encoding(encoding)
+    output_filename = output_filename or certificate_filename(row, ".pdf" if output_format == "vector"
+                                                              else encoding.extension)
+    output_path = os.path.join(output_dir, output_filename)
+    if skip_existing and os.path.exists(output_path):
+        return RenderResult(row, output_filename, errors, True, _file_hash(output_path))
+
+    # Same row, template, profile and fonts as an earlier run: reuse that PDF
+    store_key = None
+    if use_store and cert_store.enabled():
+        with metrics.stage("store_lookup"):
+            store_format = output_format if output_format == "vector" else encoding
+            store_key = cert_store.row_key(cert_store.context_digest(template_path, profile, store_format), row)
+            if cert_store.fetch(store_key, output_path):
+                return RenderResult(row, output_filename, errors, True, _file_hash(output_path))
+
+    # Written under a temporary name and renamed, so a killed run never
+    # leaves a truncated PDF behind under the real name
+    part_path = output_path + ".part"
+    try:
+        if output_format == "vector":
+            # Text is written straight into the PDF, so there is no separate draw stage
+            with metrics.stage("encode"), VectorPdf(part_path, template_path) as pdf:
+                pdf.add_page(writeup + stamps)
+            os.replace(part_path, output_path)
+            output_hash = _file_hash(output_path)
+        else:
+            with metrics.stage("draw"):
+                if encoding.draft and encoding.scale != 1:
+                    # Drawn straight onto a reduced-size decode of the template
+                    small = get_preview_template(template_path, encoding.scale)
+                    sx, sy = small.width / template_image.width, small.height / template_image.height
+                    cert = draw_certificate(small, scale_placements(writeup, sx, sy), scale_placements(stamps, sx, sy),
+                                            reuse=True)
+                else:
+                    cert = draw_certificate(template_image, writeup, stamps, reuse=True)
+            # Encoded in memory first so encode and disk write are timed separately
+            with metrics.stage("encode"):
+                if not encoding.draft:
+                    cert = downscale(cert, encoding.scale)
+                buffer = io.BytesIO()
+                encode(cert, encoding, buffer)
+            with metrics.stage("disk_write"):
+                with open(part_path, "wb") as f:
+                    f.write(buffer.getbuffer())
+                os.replace(part_path, output_path)
+            output_hash = hashlib.sha256(buffer.getbuffer()).hexdigest()
+        if store_key:
+            cert_store.put(store_key, output_path)
+        metrics.observe_row("certificate_row_seconds", time.perf_counter() - row_start)
+        if LOG_SAVES:
+            print(f"✅ Saved: {output_path}")
+        return RenderResult(row, output_filename, errors, False, output_hash)
+    except Exception as e:
+        errors.append(f"Save error for {row.name}: {e}")
+        return RenderResult(row, None, errors, False, None)
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _render_single_pdf(rows, profile, template_path, fonts, output_dir, filename=SINGLE_PDF_NAME, sheet=None,
+                       chunk_size=RENDER_CHUNK_SIZE):
+    """Write every row into one vector PDF, yielding chunk results like render_chunks.
+
+    Each row is a page, or a slot on a print sheet when sheet is given.
+    """
+    template_image = get_template(template_path)
+    output_path = os.path.join(output_dir, filename)
+    with VectorPdf(output_path + ".part", template_path, sheet=sheet) as pdf:
+        for chunk in chunk_rows(rows, chunk_size):
+            results = []
+            for row in chunk:
+                row_start = time.perf_counter()
+                with metrics.stage("layout"):
+                    writeup, stamps, errors = layout_certificate(row, profile, fonts, template_image.width)
+                if writeup is None:
+                    results.append(RenderResult(row, None, errors, False, None))
+                    continue
+                with metrics.stage("encode"):
+                    pdf.add_page(writeup + stamps)
+                metrics.observe_row("certificate_row_seconds", time.perf_counter() - row_start)
+                results.append(RenderResult(row, filename, errors, False, None))
+            yield results, take_layout_stats(), metrics.take_row_metrics()
+    os.replace(output_path + ".part", output_path)
+    if LOG_SAVES:
+        print(f"✅ Saved: {output_path}")
+
+
+# -----------------------------
+# Render worker state (see render_pool)
+# -----------------------------
+def _init_worker(profile_name, template_path, output_dir, output_format, use_store, skip_existing, encoding):
+    profile = PROFILES[profile_name]
+    get_template(template_path)
+    return (profile, template_path, load_fonts(profile), output_dir, output_format, use_store, skip_existing,
+            encoding)
+
+
+def _render_chunk(named_rows, state):
+    profile, template_path, fonts, output_dir, output_format, use_store, skip_existing, encoding = state
+    results = [
+        render_certificate(row, profile, template_path, fonts, output_dir, output_format, use_store, filename,
+                           skip_existing, encoding)
+        for row, filename in named_rows
+    ]
+    return results, take_layout_stats(), metrics.take_row_metrics()
+
+
+def generate_certificates(excel_path, template_path, profile=LONG, workers=None, progress=None, output_dir=None,
+                          output_format="raster", single_pdf=False, use_store=True, record_issued=True,
+                          print_sheet=None, skip_existing=False, encoding=None):
+    """Render every roster row to a PDF using a LayoutProfile (or its name).
+
+    PDFs go to output_dir, or to a fresh folder under OUTPUT_DIR so that
+    concurrent runs never share files; the folder is returned as
+    result["output_dir"]. progress, if given, is called as
+    progress(rows_done, rows_total, errors) after each chunk of rows finishes.
+
+    output_format "vector" embeds the template JPEG untouched and writes the
+    text as PDF text; single_pdf=True puts the whole batch into one vector
+    PDF (SINGLE_PDF_NAME) that references the background image only once.
+    print_sheet (a pdf_vector.PRINT_SHEETS key such as "a3-4up") does the
+    same but tiles the certificates onto print sheets, in PRINT_PDF_NAME.
+    Otherwise ("raster") encoding picks the file format, quality and size
+    (see encoder.ENCODINGS; a name, or an Encoding from get_encoding).
+
+    Unless use_store=False, rows rendered by an earlier run with the same
+    inputs are copied from cert_store rather than rendered again;
+    result["reused"] and result["rendered"] count the two (skip_existing=True
+    also keeps certificates already in output_dir, for resuming a run).
+    Issued rows are written to verify_index (unless record_issued=False)
+    for /verify.
+
+    Memory stays flat with roster length: each worker draws every row into
+    one reused page and encodes and writes it before the next, and
+    render_pool keeps only a few chunks in flight, so about one page per
+    worker is alive at a time (plus template_cache's bounded caches).
+    result["memory"] has the peak RSS of any render process ("peak_rss")
+    and the most any one stage grew it ("stage_growth"), in bytes.
+    """
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            return {"error": f"Unknown layout: {profile}"}
+        profile = PROFILES[profile]
+    if print_sheet and print_sheet not in PRINT_SHEETS:
+        return {"error": f"Unknown print sheet: {print_sheet}"}
+    single_name = PRINT_PDF_NAME.format(sheet=print_sheet) if print_sheet else SINGLE_PDF_NAME
+    try:
+        encoding = get_encoding(encoding)
+    except ValueError as e:
+        return {"error": str(e)}
+    extension = encoding.extension if output_format == "raster" else ".pdf"
+
+    batch_start = time.perf_counter()
+    # Streams the sheet (read-only) and validates the header before rendering
+    rows = None
+    try:
+        with metrics.stage("excel_open", metrics.REGISTRY):
+            rows, row_count = open_roster(excel_path)
+        # The naming pass reads the whole sheet (seconds for a big roster), so
+        # report the row count first rather than sit at "0 of ?"
+        if progress:
+            progress(0, row_count or 0, [])
+        # Naming pass: every row gets a unique file name (and duplicate IDs are
+        # reported) before anything renders, so workers never share a file
+        with metrics.stage("naming", metrics.REGISTRY):
+            filenames, name_problems = plan_names(open_roster(excel_path)[0], extension)
+    except Exception as e:
+        if rows is not None:
+            rows.close()
+        return {"error": f"Failed to read Excel: {e}"}
+
+    try:
+        with metrics.stage("font_load", metrics.REGISTRY):
+            fonts = load_fonts(profile)
+    except Exception as e:
+        rows.close()
+        print(f"❌ Font error: {e}")
+        return {"error": f"Font failed to load: {e}. Make sure the .ttf files are in /fonts"}
+
+    # Load Template (decoded once per process, see template_cache)
+    try:
+        with metrics.stage("template_decode", metrics.REGISTRY):
+            get_template(template_path)
+    except Exception as e:
+        rows.close()
+        return {"error": f"Failed to load template: {e}"}
+    # Rows are parsed lazily as chunks are handed out; time spent there is excel_parse
+    rows = metrics.timed_iter(rows, "excel_parse")
+
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp(prefix="run_", dir=OUTPUT_DIR)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    errors = list(name_problems)
+    layout_stats = {}
+    memory = {}
+    reused = 0
+    issued = IssuedRecorder(template_path, profile.name) if record_issued else None
+    if progress and errors:
+        progress(0, row_count or 0, errors)
+
+    # Rows are rendered in chunks across worker processes; results come back in row order
+    done = 0
+    try:
+        if single_pdf or print_sheet:
+            # One shared file, so pages are written in-process; no rasterising makes this fast
+            chunks = _render_single_pdf(rows, profile, template_path, fonts, output_dir, single_name,
+                                        PRINT_SHEETS.get(print_sheet))
+        else:
+            named_rows = ((row, filenames[row.line]) for row in rows)
+            chunks = render_chunks(
+                named_rows, _render_chunk, _init_worker,
+                (profile.name, template_path, output_dir, output_format, use_store, skip_existing, encoding),
+                workers=workers, total=row_count
+            )
+        for chunk_results in chunks:
+            chunk_results, chunk_layout_stats, chunk_metrics = chunk_results
+            add_layout_stats(layout_stats, chunk_layout_stats)
+            metrics.memory_report(chunk_metrics, memory)
+            metrics.merge_row_metrics(chunk_metrics)
+            for result in chunk_results:
+                errors.extend(result.errors)
+                if result.filename:
+                    results.append(result.filename)
+                    reused += result.reused
+                    if issued:
+                        issued.add(result.row, result.output_hash)
+            done += len(chunk_results)
+            if progress:
+                progress(done, max(row_count or 0, done), errors)
+        if issued:
+            issued.flush()
+    except Exception as e:
+        metrics.inc("certificate_batches_total", generator=profile.name, status="failed")
+        metrics.flush()
+        return {"error": f"Generation failed after {done} rows: {e}"}
+    if progress:
+        progress(done, done, errors)
+
+    rendered = len(results) - reused
+    if single_pdf or print_sheet:
+        results = [single_name] if results else []
+    if use_store and cert_store.enabled():
+        cert_store.evict()
+
+    metrics.inc("certificates_generated_total", len(results), generator=profile.name)
+    metrics.inc("certificates_reused_total", reused, generator=profile.name)
+    metrics.inc("certificate_errors_total", len(errors), generator=profile.name)
+    metrics.inc("certificate_batches_total", generator=profile.name, status="done")
+    metrics.observe("certificate_batch_seconds", time.perf_counter() - batch_start, generator=profile.name)
+    metrics.flush()
+
+    print(f"📐 Layout cache: {layout_stats}")
+    print(f"♻️ Reused {reused} certificates, rendered {rendered}")
+    if memory:
+        growth = ", ".join(f"{name} +{size >> 20} MiB" for name, size in memory.get("stage_growth", {}).items())
+        print(f"🧠 Peak render process memory {memory.get('peak_rss', 0) >> 20} MiB ({growth})")
+    return {
+        "success": True, "generated": results, "errors": errors, "output_dir": output_dir,
+        "layout_cache": layout_stats, "rendered": rendered, "reused": reused, "memory": memory,
+    }
@@ -0,0 +1,85 @@
+# font_registry.py
+from PIL import ImageFont
+import io
+import os
+import threading
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Relative font paths (e.g. "fonts/arial.ttf") resolve against the package,
+# not the working directory the app happens to be started from
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Auto-fit shrinks a font this many points at a time
+AUTOFIT_STEP = 2
+
+_font_bytes = {}  # resolved path -> file contents
+_faces = {}  # (resolved path, size) -> FreeTypeFont
+_lock = threading.Lock()
+
+
+def _reset_lock():
+    # A fork taken while another thread held the lock would leave it locked
+    # forever in the child; the cached faces themselves are safe to inherit.
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock)
+
+
+def resolve(path):
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+def font_bytes(path):
+    """Contents of a font file, read from disk once per process."""
+    path = resolve(path)
+    with _lock:
+        data = _font_bytes.get(path)
+        if data is None:
+            with open(path, "rb") as f:
+                data = _font_bytes[path] = f.read()
+        return data
+
+
+def get_font(path, size):
+    """Return the FreeTypeFont for (path, size), loading it once per process.
+
+    Faces are built from the in-memory file, so extra sizes (see fit_font)
+    never touch the disk. font.path is still the file path: layout caches,
+    VectorPdf font embedding and pickling all key on it.
+    """
+    path = resolve(path)
+    key = (path, size)
+    font = _faces.get(key)
+    if font is None:
+        data = font_bytes(path)
+        with _lock:
+            font = _faces.get(key)
+            if font is None:
+                font = ImageFont.truetype(io.BytesIO(data), size)
+                font.path = path
+                _faces[key] = font
+    return font
+
+
+def text_box_width(font, text):
+    bbox = font.getbbox(text)
+    return bbox[2] - bbox[0]
+
+
+def fit_font(path, size, text, max_width, min_size):
+    """Largest font of at most size (down to min_size) that fits text in max_width."""
+    font = get_font(path, size)
+    while size > min_size and text_box_width(font, text) > max_width:
+        size = max(size - AUTOFIT_STEP, min_size)
+        font = get_font(path, size)
+    return font
+
+
+def clear_fonts():
+    with _lock:
+        _faces.clear()
+        _font_bytes.clear()
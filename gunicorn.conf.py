@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# Usage: gunicorn app:app
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+# Each worker's running jobs start their own render pool, so memory grows
+# with this too (see render_pool.RENDER_WORKERS for the ceiling)
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# Threaded workers: a sync worker can't send its heartbeat while it streams a
+# response, so a ZIP download longer than timeout got it killed mid-archive
+# (taking its background jobs with it). With gthread the worker's main loop
+# keeps beating while a thread streams, and a few slow downloads don't block
+# the other requests.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# Only a worker that stops responding altogether is killed after this
+timeout = 120
+
+# Import app.py once in the master: fonts, templates and layout profiles are
+# loaded there (engine.preload) and every forked worker inherits them warm.
+preload_app = True
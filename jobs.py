@@ -0,0 +1,348 @@
+# jobs.py
+from concurrent.futures import ThreadPoolExecutor
+import cProfile
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from engine import generate_certificates
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Job state lives in SQLite so any gunicorn worker can answer a status poll,
+# whichever worker happens to be running the job.
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", os.path.join(BASE_DIR, "jobs.db"))
+# Concurrent jobs per process (each job already fans out over render_pool)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+# Minimum seconds between progress writes for one job
+PROGRESS_INTERVAL = 0.5
+# Every job renders into its own folder here, so concurrent jobs (in any
+# worker) never clobber each other's files
+JOBS_OUTPUT_DIR = os.path.join(os.getcwd(), "generated_certificates")
+# Finished jobs (and their PDFs/uploads) are removed after this many seconds
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 3600))
+CLEANUP_INTERVAL = 300
+# Uploads saved by /preview and never confirmed are removed after this many seconds
+PREVIEW_TTL_SECONDS = int(os.environ.get("PREVIEW_TTL_SECONDS", JOB_TTL_SECONDS))
+# Each process touches its queued/running jobs every CLEANUP_INTERVAL; a job
+# not touched for this long lost its worker (restart, redeploy, crash) and
+# is marked failed
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 3 * CLEANUP_INTERVAL))
+STALE_JOB_ERROR = "The server restarted while this batch was running. Please upload it again."
+# Jobs submitted with options {"profile": True} dump a cProfile here as <job_id>.prof
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.getcwd(), "profiles"))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="cert-job")
+# Jobs queued or running in this process, kept alive by _heartbeat
+_live_jobs = set()
+_live_lock = threading.Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_db():
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                excel_path TEXT NOT NULL,
+                template_path TEXT NOT NULL,
+                output_dir TEXT,
+                options TEXT NOT NULL DEFAULT '{}',
+                rows_total INTEGER,
+                rows_done INTEGER NOT NULL DEFAULT 0,
+                errors TEXT NOT NULL DEFAULT '[]',
+                generated TEXT NOT NULL DEFAULT '[]',
+                error TEXT,
+                rendered INTEGER,
+                reused INTEGER,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                updated_at REAL
+            )
+        """)
+        # Databases created before these columns existed
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in [("output_dir", "TEXT"), ("options", "TEXT NOT NULL DEFAULT '{}'"),
+                                   ("rendered", "INTEGER"), ("reused", "INTEGER"), ("updated_at", "REAL")]:
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        # Uploads saved by /preview and not yet confirmed (see record_preview)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS previews (
+                id TEXT PRIMARY KEY,
+                excel_path TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+    conn.close()
+
+
+def _update(job_id, **fields):
+    fields["updated_at"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    conn = _connect()
+    with conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+    conn.close()
+
+
+def submit_job(excel_path, template_path, options=None):
+    """Queue a generation run and return its job ID immediately.
+
+    options are extra keyword arguments for generate_certificates
+    (e.g. output_format, single_pdf), plus "layout" (an engine.PROFILES
+    name, default "long") and "profile" (dump a cProfile of the run).
+    """
+    options = options or {}
+    job_id = uuid.uuid4().hex
+    output_dir = os.path.join(JOBS_OUTPUT_DIR, job_id)
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, excel_path, template_path, output_dir, options, created_at, updated_at)"
+            " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, excel_path, template_path, output_dir, json.dumps(options), now, now),
+        )
+    conn.close()
+    with _live_lock:
+        _live_jobs.add(job_id)
+    _start_cleanup_thread()
+    _executor.submit(_run_job, job_id, excel_path, template_path, output_dir, options)
+    return job_id
+
+
+def record_preview(excel_path):
+    """Remember an unconfirmed preview upload and return its ID.
+
+    cleanup_expired removes the upload if it is never confirmed (see
+    claim_preview).
+    """
+    preview_id = uuid.uuid4().hex
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT INTO previews (id, excel_path, created_at) VALUES (?, ?, ?)",
+                     (preview_id, excel_path, time.time()))
+    conn.close()
+    _start_cleanup_thread()
+    return preview_id
+
+
+def claim_preview(preview_id):
+    """Forget a preview so cleanup no longer touches its upload.
+
+    Returns False if it was already expired (its upload is gone).
+    """
+    conn = _connect()
+    with conn:
+        claimed = conn.execute("DELETE FROM previews WHERE id = ?", (preview_id,)).rowcount
+    conn.close()
+    return bool(claimed)
+
+
+def _run_job(job_id, excel_path, template_path, output_dir, options):
+    try:
+        _run_job_tracked(job_id, excel_path, template_path, output_dir, options)
+    finally:
+        with _live_lock:
+            _live_jobs.discard(job_id)
+
+
+def _run_job_tracked(job_id, excel_path, template_path, output_dir, options):
+    _update(job_id, status="running", started_at=time.time())
+    last_write = 0.0
+
+    def progress(done, total, errors):
+        nonlocal last_write
+        now = time.time()
+        if now - last_write >= PROGRESS_INTERVAL or done == total:
+            last_write = now
+            _update(job_id, rows_done=done, rows_total=total, errors=json.dumps(errors))
+
+    options = dict(options)
+    layout = options.pop("layout", "long")
+    profiler = None
+    if options.pop("profile", False):
+        # Render in this process so the profile covers layout, drawing and encoding too
+        options["workers"] = 1
+        profiler = cProfile.Profile()
+
+    try:
+        if profiler:
+            result = profiler.runcall(
+                generate_certificates, excel_path, template_path, layout,
+                progress=progress, output_dir=output_dir, **options
+            )
+        else:
+            result = generate_certificates(
+                excel_path, template_path, layout, progress=progress, output_dir=output_dir, **options
+            )
+    except Exception as e:
+        result = {"error": str(e)}
+
+    if profiler:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_path = os.path.join(PROFILE_DIR, f"{job_id}.prof")
+        profiler.dump_stats(profile_path)
+        print(f"📊 Profile written to {profile_path}")
+
+    if result.get("error"):
+        _update(job_id, status="failed", error=result["error"], finished_at=time.time())
+        return
+    _update(
+        job_id,
+        status="done",
+        errors=json.dumps(result.get("errors", [])),
+        generated=json.dumps(result.get("generated", [])),
+        rendered=result.get("rendered"),
+        reused=result.get("reused"),
+        finished_at=time.time(),
+    )
+
+
+def get_job(job_id):
+    """Return the job as a dict (with an ETA while running), or None."""
+    conn = _connect()
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    if row["status"] in ("queued", "running") and \
+            (row["updated_at"] or row["created_at"]) < time.time() - JOB_STALE_SECONDS:
+        # Its process is gone, so nothing else will ever finish it
+        fail_stale_jobs()
+        return get_job(job_id)
+
+    job = dict(row)
+    job["errors"] = json.loads(job["errors"])
+    job["generated"] = json.loads(job["generated"])
+    job["options"] = json.loads(job["options"])
+
+    eta = None
+    if job["status"] == "running" and job["rows_done"] and job["rows_total"]:
+        elapsed = time.time() - job["started_at"]
+        eta = elapsed / job["rows_done"] * (job["rows_total"] - job["rows_done"])
+    elif job["status"] == "done":
+        eta = 0
+    job["eta_seconds"] = eta
+    return job
+
+
+# -----------------------------
+# Background cleanup of expired runs
+# -----------------------------
+def _heartbeat():
+    """Mark this process's queued and running jobs as still alive."""
+    with _live_lock:
+        live = [(time.time(), job_id) for job_id in _live_jobs]
+    if not live:
+        return
+    conn = _connect()
+    with conn:
+        conn.executemany("UPDATE jobs SET updated_at = ? WHERE id = ?", live)
+    conn.close()
+
+
+def fail_stale_jobs(now=None):
+    """Mark queued/running jobs whose process stopped touching them as failed.
+
+    finished_at is set to their last sign of life, so their files expire
+    JOB_TTL_SECONDS after that like any other finished job.
+    """
+    cutoff = (now or time.time()) - JOB_STALE_SECONDS
+    conn = _connect()
+    with conn:
+        stale = conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?,"
+            " finished_at = COALESCE(updated_at, started_at, created_at)"
+            " WHERE status IN ('queued', 'running') AND COALESCE(updated_at, started_at, created_at) < ?",
+            (STALE_JOB_ERROR, cutoff),
+        ).rowcount
+    conn.close()
+    if stale:
+        print(f"⚠️ Marked {stale} interrupted jobs as failed")
+    return stale
+
+
+def cleanup_expired(now=None):
+    """Delete output folders and uploads of jobs older than JOB_TTL_SECONDS.
+
+    Jobs left queued or running by a process that went away are failed
+    first (see fail_stale_jobs), so they are cleaned up too, and so are
+    previews not confirmed within PREVIEW_TTL_SECONDS.
+    """
+    fail_stale_jobs(now)
+    cutoff = (now or time.time()) - JOB_TTL_SECONDS
+    conn = _connect()
+    abandoned = conn.execute(
+        "SELECT id, excel_path FROM previews WHERE created_at < ?",
+        ((now or time.time()) - PREVIEW_TTL_SECONDS,),
+    ).fetchall()
+    for preview in abandoned:
+        try:
+            os.remove(preview["excel_path"])
+        except OSError:
+            pass
+    with conn:
+        conn.executemany("DELETE FROM previews WHERE id = ?", [(preview["id"],) for preview in abandoned])
+    expired = conn.execute(
+        "SELECT id, excel_path, output_dir FROM jobs"
+        " WHERE status IN ('done', 'failed') AND finished_at < ?",
+        (cutoff,),
+    ).fetchall()
+    for job in expired:
+        if job["output_dir"]:
+            shutil.rmtree(job["output_dir"], ignore_errors=True)
+        try:
+            os.remove(job["excel_path"])
+        except OSError:
+            pass
+    with conn:
+        conn.executemany("UPDATE jobs SET status = 'expired' WHERE id = ?", [(job["id"],) for job in expired])
+    conn.close()
+
+    # Run folders left behind by direct generate_certificates() calls
+    if os.path.isdir(JOBS_OUTPUT_DIR):
+        for entry in os.scandir(JOBS_OUTPUT_DIR):
+            if entry.name.startswith("run_") and entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    return len(expired)
+
+
+_cleanup_started = False
+_cleanup_lock = threading.Lock()
+
+
+def _cleanup_loop():
+    while True:
+        time.sleep(CLEANUP_INTERVAL)
+        try:
+            _heartbeat()
+            cleanup_expired()
+        except Exception as e:
+            print(f"❌ Job cleanup failed: {e}")
+
+
+def _start_cleanup_thread():
+    # Started lazily so it runs in each gunicorn worker, not the preload master
+    global _cleanup_started
+    with _cleanup_lock:
+        if not _cleanup_started:
+            threading.Thread(target=_cleanup_loop, name="cert-job-cleanup", daemon=True).start()
+            _cleanup_started = True
+
+
+init_db()
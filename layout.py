@@ -0,0 +1,166 @@
+# layout.py
+from collections import OrderedDict
+import os
+import threading
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Glyph-run widths memoized per (font, text)
+WIDTH_CACHE_SIZE = int(os.environ.get("WIDTH_CACHE_SIZE", 20000))
+# Fully wrapped and positioned paragraphs
+PARAGRAPH_CACHE_SIZE = int(os.environ.get("PARAGRAPH_CACHE_SIZE", 256))
+
+
+class LRUCache:
+    """Small thread-safe LRU with hit/miss counters."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def take_counts(self):
+        with self._lock:
+            counts = (self.hits, self.misses)
+            self.hits = self.misses = 0
+            return counts
+
+
+_widths = LRUCache(WIDTH_CACHE_SIZE)
+_paragraphs = LRUCache(PARAGRAPH_CACHE_SIZE)
+
+
+def font_key(font):
+    return (getattr(font, "path", None) or id(font), font.size)
+
+
+def text_width(font, text):
+    """Memoized equivalent of draw.textlength(text, font=font)."""
+    key = (font_key(font), text)
+    width = _widths.get(key)
+    if width is None:
+        width = font.getlength(text)
+        _widths.put(key, width)
+    return width
+
+
+def take_layout_stats():
+    """Return cache hit/miss counts since the last call and reset them.
+
+    Rendering workers return this with each chunk so the parent can add up
+    counts across processes.
+    """
+    width_hits, width_misses = _widths.take_counts()
+    paragraph_hits, paragraph_misses = _paragraphs.take_counts()
+    return {
+        "width_hits": width_hits,
+        "width_misses": width_misses,
+        "paragraph_hits": paragraph_hits,
+        "paragraph_misses": paragraph_misses,
+    }
+
+
+def clear_layout_cache():
+    for cache in (_widths, _paragraphs):
+        with cache._lock:
+            cache._data.clear()
+
+
+def add_layout_stats(total, stats):
+    for name, count in stats.items():
+        total[name] = total.get(name, 0) + count
+    return total
+
+
+def split_text_with_bold(text, bold_phrases):
+    chunks = [(text, False)]
+    for phrase in bold_phrases:
+        new_chunks = []
+        for chunk_text, is_bold in chunks:
+            if is_bold:
+                new_chunks.append((chunk_text, is_bold))
+                continue
+            idx = chunk_text.lower().find(phrase.lower())
+            while idx != -1:
+                before = chunk_text[:idx]
+                match = chunk_text[idx:idx + len(phrase)]
+                after = chunk_text[idx + len(phrase):]
+                if before:
+                    new_chunks.append((before, False))
+                new_chunks.append((match, True))
+                chunk_text = after
+                idx = chunk_text.lower().find(phrase.lower())
+            if chunk_text:
+                new_chunks.append((chunk_text, False))
+        chunks = new_chunks
+    return chunks
+
+
+def wrap_text_chunks(chunks, max_width, font_reg, font_bold):
+    lines = []
+    current_line = []
+    current_width = 0
+    for text, is_bold in chunks:
+        words = text.split(' ')
+        for word in words:
+            word += " "
+            clean_word = word.replace('\n', '')
+            font = font_bold if is_bold else font_reg
+            word_width = text_width(font, clean_word)
+            if current_width + word_width <= max_width:
+                current_line.append((clean_word, font))
+                current_width += word_width
+            else:
+                lines.append(current_line)
+                current_line = [(clean_word, font)]
+                current_width = word_width
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def layout_paragraph(text, bold_phrases, font_reg, font_bold, max_width, canvas_width, start_y, line_height):
+    """Wrap and centre a paragraph; returns a tuple of (x, y, word, font).
+
+    The result is cached per (text, bold phrases, fonts, geometry), so a
+    write-up shared by many rows is only laid out once per batch.
+    """
+    key = (text, tuple(bold_phrases), font_key(font_reg), font_key(font_bold),
+           max_width, canvas_width, start_y, line_height)
+    placed = _paragraphs.get(key)
+    if placed is not None:
+        return placed
+
+    placed = []
+    y = start_y
+    for line in wrap_text_chunks(split_text_with_bold(text, bold_phrases), max_width, font_reg, font_bold):
+        line_width = sum(text_width(font, word) for word, font in line)
+        x = (canvas_width - line_width) // 2
+        for word, font in line:
+            placed.append((x, y, word, font))
+            x += text_width(font, word)
+        y += line_height
+    placed = tuple(placed)
+    _paragraphs.put(key, placed)
+    return placed
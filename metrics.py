@@ -0,0 +1,258 @@
+# metrics.py
+from contextlib import contextmanager
+import glob
+import json
+import os
+import threading
+import time
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Histogram buckets (seconds): from a single draw.text call up to a whole batch
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# With several gunicorn workers, set this so each process publishes its
+# numbers there and /metrics reports the sum over all of them.
+METRICS_DIR = os.environ.get("METRICS_DIR")
+
+HELP = {
+    "certificate_stage_seconds": "Time spent per certificate generation stage.",
+    "certificate_stage_rss_growth_bytes": "Largest growth in resident memory during one run of a stage.",
+    "certificate_process_peak_rss_bytes": "Highest resident memory of any one rendering process.",
+    "certificate_row_seconds": "Time to render and save one certificate.",
+    "certificate_batch_seconds": "Time for a whole generate_certificates run.",
+    "certificates_generated_total": "Certificates written.",
+    "certificates_reused_total": "Certificates copied from the certificate store instead of rendered.",
+    "certificate_errors_total": "Per-row errors reported.",
+    "certificate_batches_total": "generate_certificates runs by outcome.",
+    "zip_stream_seconds": "Time to stream a certificate ZIP to the client.",
+    "zip_stream_bytes_total": "Bytes of ZIP archives streamed.",
+    "http_request_seconds": "Flask request handling time (excluding streamed bodies).",
+}
+
+
+class Registry:
+    """Counters, histograms and peak gauges keyed by (name, sorted label items)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}  # key -> [bucket counts..., sum, count]
+        self.peaks = {}  # key -> highest value seen (merged with max, not summed)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def set_max(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if value > self.peaks.get(key, 0):
+                self.peaks[key] = value
+
+    def take_snapshot(self):
+        """Return everything recorded so far as plain data and reset."""
+        with self.lock:
+            snapshot = {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, labels, hist] for (name, labels), hist in self.histograms.items()],
+                "peaks": [[name, labels, value] for (name, labels), value in self.peaks.items()],
+            }
+            self.counters = {}
+            self.histograms = {}
+            self.peaks = {}
+        return snapshot
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, labels, list(hist)] for (name, labels), hist in self.histograms.items()],
+                "peaks": [[name, labels, value] for (name, labels), value in self.peaks.items()],
+            }
+
+    def merge(self, snapshot):
+        with self.lock:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(tuple(item) for item in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, hist in snapshot["histograms"]:
+                key = (name, tuple(tuple(item) for item in labels))
+                current = self.histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+                for i, value in enumerate(hist):
+                    current[i] += value
+            for name, labels, value in snapshot.get("peaks", ()):
+                key = (name, tuple(tuple(item) for item in labels))
+                self.peaks[key] = max(self.peaks.get(key, 0), value)
+
+
+# Process-wide registry served at /metrics
+REGISTRY = Registry()
+# Row-level numbers recorded while rendering. Worker processes can't write
+# to the parent's REGISTRY, so render chunks hand these back with their
+# results (take_row_metrics) and the parent merges them in.
+_rows = Registry()
+
+
+def inc(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    """This process's resident memory in bytes (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+@contextmanager
+def stage(name, registry=None):
+    """Time a block as certificate_stage_seconds{stage=name}.
+
+    How much the block grew resident memory is kept as the peak
+    certificate_stage_rss_growth_bytes{stage=name}, and the process's
+    resident memory afterwards as certificate_process_peak_rss_bytes.
+    """
+    rss_before = current_rss()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry = registry or _rows
+        registry.observe("certificate_stage_seconds", time.perf_counter() - start, stage=name)
+        rss_after = current_rss()
+        registry.set_max("certificate_stage_rss_growth_bytes", rss_after - rss_before, stage=name)
+        registry.set_max("certificate_process_peak_rss_bytes", rss_after)
+
+
+def observe_row(name, value, **labels):
+    _rows.observe(name, value, **labels)
+
+
+def take_row_metrics():
+    return _rows.take_snapshot()
+
+
+def merge_row_metrics(snapshot):
+    REGISTRY.merge(snapshot)
+
+
+def memory_report(snapshot, report):
+    """Fold a snapshot's memory peaks into report, a dict of peak_rss and {stage: rss growth}."""
+    for name, labels, value in snapshot.get("peaks", ()):
+        if name == "certificate_process_peak_rss_bytes":
+            report["peak_rss"] = max(report.get("peak_rss", 0), value)
+        elif name == "certificate_stage_rss_growth_bytes":
+            stages = report.setdefault("stage_growth", {})
+            stage_name = dict(tuple(item) for item in labels)["stage"]
+            stages[stage_name] = max(stages.get(stage_name, 0), value)
+    return report
+
+
+def timed_iter(iterable, stage_name):
+    """Yield from iterable, recording time spent waiting on it as a stage."""
+    iterator = iter(iterable)
+    total = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                total += time.perf_counter() - start
+            yield item
+    finally:
+        REGISTRY.observe("certificate_stage_seconds", total, stage=stage_name)
+
+
+# -----------------------------
+# Multi-process publishing
+# -----------------------------
+def flush():
+    """Publish this process's totals to METRICS_DIR (no-op when unset)."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(path + ".tmp", path)
+
+
+def _combined():
+    combined = Registry()
+    combined.merge(REGISTRY.snapshot())
+    if METRICS_DIR:
+        own = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    combined.merge(json.load(f))
+            except (OSError, ValueError):
+                pass
+    return combined
+
+
+# -----------------------------
+# Prometheus text format
+# -----------------------------
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def render_prometheus():
+    registry = _combined()
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(registry.counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), value in sorted(registry.peaks.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), hist in sorted(registry.histograms.items()):
+        header(name, "histogram")
+        for bound, count in zip(BUCKETS, hist):
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+        lines.append(f"{name}_sum{_labels(labels)} {hist[-2]}")
+        lines.append(f"{name}_count{_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
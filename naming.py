@@ -0,0 +1,66 @@
+# naming.py
+from collections import defaultdict
+import os
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+FILENAME_SUFFIX = "_certificate"
+
+
+def safe_part(text):
+    return "".join(c for c in str(text) if c.isalnum() or c in " _-").strip().replace(" ", "_")
+
+
+def certificate_filename(row, extension=".pdf"):
+    """Base file name for a roster.RosterRow: name, course and certificate ID."""
+    parts = [safe_part(row.name), safe_part(row.course)]
+    if row.cert_id and safe_part(row.cert_id):
+        parts.append(safe_part(row.cert_id))
+    return "_".join(parts) + FILENAME_SUFFIX + extension
+
+
+def plan_names(rows, extension=".pdf"):
+    """Give every row a unique output file name in one pass over the roster.
+
+    Returns (filenames, problems): filenames maps row.line to its file name,
+    problems lists duplicate certificate IDs and rows whose names collide.
+    Colliding rows keep the first name for the first row and get _2, _3...
+    after it, in sheet order, so the result is the same on every run and
+    parallel workers never write to the same file. Names are compared
+    case-insensitively, as some filesystems do.
+    """
+    filenames = {}
+    taken = set()
+    id_lines = defaultdict(list)
+    first_line = {}  # lower-cased base name -> (base name, first line using it)
+    collisions = defaultdict(list)  # lower-cased base name -> later lines
+
+    for row in rows:
+        if row.cert_id:
+            id_lines[row.cert_id].append(row.line)
+
+        base = certificate_filename(row, extension)
+        first_line.setdefault(base.lower(), (base, row.line))
+        filename = base
+        stem, suffix = os.path.splitext(base)
+        number = 1
+        while filename.lower() in taken:
+            number += 1
+            filename = f"{stem}_{number}{suffix}"
+        if number > 1:
+            collisions[base.lower()].append(row.line)
+        taken.add(filename.lower())
+        filenames[row.line] = filename
+
+    problems = []
+    for cert_id, lines in id_lines.items():
+        if len(lines) > 1:
+            problems.append(f"Duplicate certificate ID {cert_id} on lines {', '.join(map(str, lines))}")
+    for key, lines in collisions.items():
+        base, first = first_line[key]
+        problems.append(
+            f"Name collision for {base} on lines {', '.join(map(str, [first, *lines]))}"
+            f" (later rows numbered _2, _3, ...)"
+        )
+    return filenames, problems
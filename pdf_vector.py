@@ -0,0 +1,433 @@
+# pdf_vector.py
+from PIL import Image
+from font_registry import font_bytes, get_font
+from collections import namedtuple
+import hashlib
+import io
+import struct
+import zlib
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Same page size as the raster path: cert.save(..., "PDF", resolution=100.0)
+PDF_DPI = 100.0
+# Fonts are embedded as Type0/CIDFontType2 with Identity-H: text is written
+# as 2-byte glyph IDs, so any character the font has prints (Ọ, ọ̀, Ş...),
+# and a ToUnicode map keeps it searchable and copyable.
+TOUNICODE_CHUNK = 100  # entries per beginbfchar block (the spec's limit)
+
+# Print-run sheets: certificates are scaled to fit cols x rows slots on a
+# page of width x height points, inside margin, with gutter between slots.
+PrintSheet = namedtuple("PrintSheet", "name width height cols rows margin gutter")
+PRINT_SHEETS = {
+    "a4": PrintSheet("a4", 842, 595, 1, 1, 18, 0),
+    "a4-2up": PrintSheet("a4-2up", 595, 842, 1, 2, 18, 18),
+    "a3-2up": PrintSheet("a3-2up", 842, 1191, 1, 2, 24, 24),
+    "a3-4up": PrintSheet("a3-4up", 1191, 842, 2, 2, 24, 18),
+}
+# Length of the cut marks drawn around each slot on multi-up sheets (points)
+CROP_MARK = 9
+
+# Tables a PDF viewer needs from an embedded TrueType font
+_KEEP_TABLES = (b"head", b"hhea", b"hmtx", b"maxp", b"cmap", b"loca", b"glyf",
+                b"cvt ", b"fpgm", b"prep", b"name", b"OS/2", b"post")
+
+
+# -----------------------------
+# TrueType glyph stripping
+# -----------------------------
+def _cmap_format4(data, cmap_offset):
+    """Return a char -> glyph ID lookup from the (3, 1) format 4 subtable."""
+    count = struct.unpack_from(">H", data, cmap_offset + 2)[0]
+    for i in range(count):
+        platform, encoding, offset = struct.unpack_from(">HHI", data, cmap_offset + 4 + i * 8)
+        table = cmap_offset + offset
+        if (platform, encoding) == (3, 1) and struct.unpack_from(">H", data, table)[0] == 4:
+            break
+    else:
+        raise ValueError("no (3, 1) format 4 cmap")
+
+    seg_count = struct.unpack_from(">H", data, table + 6)[0] // 2
+    ends = table + 14
+    starts = ends + seg_count * 2 + 2
+    deltas = starts + seg_count * 2
+    range_offsets = deltas + seg_count * 2
+
+    def lookup(code):
+        for i in range(seg_count):
+            end = struct.unpack_from(">H", data, ends + i * 2)[0]
+            if end < code:
+                continue
+            start = struct.unpack_from(">H", data, starts + i * 2)[0]
+            if start > code:
+                return 0
+            delta = struct.unpack_from(">h", data, deltas + i * 2)[0]
+            range_offset = struct.unpack_from(">H", data, range_offsets + i * 2)[0]
+            if range_offset == 0:
+                return (code + delta) & 0xFFFF
+            glyph = struct.unpack_from(">H", data, range_offsets + i * 2 + range_offset + 2 * (code - start))[0]
+            return (glyph + delta) & 0xFFFF if glyph else 0
+        return 0
+
+    return lookup
+
+
+def subset_truetype(data, chars):
+    """Blank out every glyph not needed for chars, keeping glyph IDs stable.
+
+    The cmap, metrics and glyph numbering are untouched, so the result is a
+    drop-in FontFile2 for a CIDFontType2 with /CIDToGIDMap /Identity, just
+    much smaller.
+    """
+    num_tables = struct.unpack_from(">H", data, 4)[0]
+    tables = {}
+    for i in range(num_tables):
+        tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + i * 16)
+        tables[tag] = (offset, length)
+
+    head = tables[b"head"][0]
+    long_loca = struct.unpack_from(">h", data, head + 50)[0] == 1
+    num_glyphs = struct.unpack_from(">H", data, tables[b"maxp"][0] + 4)[0]
+    loca = tables[b"loca"][0]
+    if long_loca:
+        offsets = struct.unpack_from(f">{num_glyphs + 1}I", data, loca)
+    else:
+        offsets = [o * 2 for o in struct.unpack_from(f">{num_glyphs + 1}H", data, loca)]
+    glyf = tables[b"glyf"][0]
+
+    lookup = _cmap_format4(data, tables[b"cmap"][0])
+    pending = {0} | {lookup(ord(c)) for c in chars}
+    keep = set()
+    while pending:
+        glyph = pending.pop()
+        if glyph in keep or glyph >= num_glyphs:
+            continue
+        keep.add(glyph)
+        start, end = glyf + offsets[glyph], glyf + offsets[glyph + 1]
+        if end - start < 10 or struct.unpack_from(">h", data, start)[0] >= 0:
+            continue
+        # Composite glyph: keep its components too
+        pos = start + 10
+        while True:
+            flags, component = struct.unpack_from(">HH", data, pos)
+            pending.add(component)
+            pos += 4 + (4 if flags & 0x0001 else 2)
+            if flags & 0x0008:
+                pos += 2
+            elif flags & 0x0040:
+                pos += 4
+            elif flags & 0x0080:
+                pos += 8
+            if not flags & 0x0020:
+                break
+
+    new_glyf = bytearray()
+    new_loca = []
+    for glyph in range(num_glyphs):
+        new_loca.append(len(new_glyf))
+        if glyph in keep:
+            new_glyf += data[glyf + offsets[glyph]:glyf + offsets[glyph + 1]]
+            new_glyf += b"\0" * (-len(new_glyf) % 4)
+    new_loca.append(len(new_glyf))
+
+    new_head = bytearray(data[head:head + tables[b"head"][1]])
+    struct.pack_into(">I", new_head, 8, 0)  # checkSumAdjustment
+    struct.pack_into(">h", new_head, 50, 1)  # long loca
+    replaced = {
+        b"head": bytes(new_head),
+        b"loca": struct.pack(f">{len(new_loca)}I", *new_loca),
+        b"glyf": bytes(new_glyf),
+    }
+
+    tags = [tag for tag in sorted(tables) if tag in _KEEP_TABLES]
+    body = bytearray()
+    directory = bytearray(struct.pack(">IHHHH", 0x00010000, len(tags), 0, 0, 0))
+    offset = 12 + 16 * len(tags)
+    for tag in tags:
+        start, length = tables[tag]
+        table = replaced.get(tag, data[start:start + length])
+        padded = table + b"\0" * (-len(table) % 4)
+        checksum = sum(struct.unpack(f">{len(padded) // 4}I", padded)) & 0xFFFFFFFF
+        directory += struct.pack(">4sIII", tag, checksum, offset + len(body), len(table))
+        body += padded
+    return bytes(directory + body)
+
+
+# -----------------------------
+# PDF writer
+# -----------------------------
+def _table_offsets(data):
+    num_tables = struct.unpack_from(">H", data, 4)[0]
+    return {
+        tag: offset
+        for tag, _, offset, _ in (struct.unpack_from(">4sIII", data, 12 + i * 16) for i in range(num_tables))
+    }
+
+
+class _EmbeddedFont:
+    """One font as used in a document: glyph IDs for its characters and their widths."""
+
+    def __init__(self, path, name, obj_id):
+        self.path = path
+        self.name = name
+        self.obj_id = obj_id
+        data = font_bytes(path)
+        tables = _table_offsets(data)
+        self._lookup = _cmap_format4(data, tables[b"cmap"])
+        units_per_em = struct.unpack_from(">H", data, tables[b"head"] + 18)[0]
+        metric_count = struct.unpack_from(">H", data, tables[b"hhea"] + 34)[0]
+        advances = struct.unpack_from(f">{metric_count * 2}H", data, tables[b"hmtx"])[::2]
+        self._advance = lambda glyph: advances[min(glyph, metric_count - 1)] * 1000 / units_per_em
+        self._glyphs = {}  # char -> glyph ID
+        self.used = {}  # glyph ID -> char, for the widths and ToUnicode map
+
+    def encode(self, text):
+        """text as a PDF hex string of 2-byte glyph IDs (Identity-H)."""
+        glyphs = []
+        for char in text:
+            glyph = self._glyphs.get(char)
+            if glyph is None:
+                glyph = self._glyphs[char] = self._lookup(ord(char)) if ord(char) <= 0xFFFF else 0
+            self.used.setdefault(glyph, char)
+            glyphs.append(glyph)
+        return b"<" + "".join(f"{glyph:04X}" for glyph in glyphs).encode() + b">"
+
+    def widths(self):
+        return " ".join(f"{glyph} [{round(self._advance(glyph))}]" for glyph in sorted(self.used))
+
+    def to_unicode(self):
+        mapped = [(glyph, char) for glyph, char in sorted(self.used.items()) if glyph]
+        blocks = []
+        for start in range(0, len(mapped), TOUNICODE_CHUNK):
+            chunk = mapped[start:start + TOUNICODE_CHUNK]
+            entries = "\n".join(f"<{glyph:04X}> <{char.encode('utf-16-be').hex().upper()}>" for glyph, char in chunk)
+            blocks.append(f"{len(chunk)} beginbfchar\n{entries}\nendbfchar")
+        return (
+            "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+            "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+            + "\n".join(blocks)
+            + "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend"
+        ).encode()
+
+
+def _fmt(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def _crop_marks(x, y, w, h):
+    """Thin cut marks just outside the corners of a slot."""
+    m = CROP_MARK
+    lines = []
+    for cx, dx in ((x, -1), (x + w, 1)):
+        for cy, dy in ((y, -1), (y + h, 1)):
+            lines.append(f"{_fmt(cx + dx * 2)} {_fmt(cy)} m {_fmt(cx + dx * (m + 2))} {_fmt(cy)} l")
+            lines.append(f"{_fmt(cx)} {_fmt(cy + dy * 2)} m {_fmt(cx)} {_fmt(cy + dy * (m + 2))} l")
+    return ("q 0.25 w 0 G " + " ".join(lines) + " S Q").encode()
+
+
+class VectorPdf:
+    """Write certificates as vector PDF pages over the template image.
+
+    The template JPEG is embedded once, byte for byte (no re-encode), and
+    every page draws it as a shared XObject. Text is placed with the same
+    pixel coordinates the raster path uses, as real text in the bundled TTF
+    fonts (subset to the glyphs used). Pages are streamed to disk as they
+    are added, so a batch of any size can go into one file.
+
+    With sheet (a PrintSheet), certificates are tiled onto print sheets
+    instead: each add_page fills the next slot and a sheet is written as
+    soon as its slots are full.
+    """
+
+    def __init__(self, path, template_path, dpi=PDF_DPI, sheet=None):
+        self._file = open(path, "wb")
+        self._offsets = {}
+        self._next_id = 4  # 1 = catalog, 2 = page tree, 3 = shared resources
+        self._pages = []
+        self._fonts = {}  # font path -> _EmbeddedFont
+        self._scale = 72.0 / dpi
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        self._image_id, (self._width_px, self._height_px) = self._write_image(template_path)
+        self.page_width = self._width_px * self._scale
+        self.page_height = self._height_px * self._scale
+
+        self._sheet = sheet
+        self._slots = []  # content ops of certificates waiting for the current sheet
+        if sheet:
+            cell_width = (sheet.width - 2 * sheet.margin - (sheet.cols - 1) * sheet.gutter) / sheet.cols
+            cell_height = (sheet.height - 2 * sheet.margin - (sheet.rows - 1) * sheet.gutter) / sheet.rows
+            self._slot_scale = min(cell_width / self.page_width, cell_height / self.page_height)
+            self._slot_origins = []
+            for row in range(sheet.rows):  # top to bottom, left to right
+                for col in range(sheet.cols):
+                    x = sheet.margin + col * (cell_width + sheet.gutter)
+                    y = sheet.height - sheet.margin - (row + 1) * cell_height - row * sheet.gutter
+                    self._slot_origins.append((
+                        x + (cell_width - self.page_width * self._slot_scale) / 2,
+                        y + (cell_height - self.page_height * self._slot_scale) / 2,
+                    ))
+
+    def _alloc(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, body, stream=None):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f"{obj_id} 0 obj\n".encode())
+        if stream is None:
+            self._file.write(body + b"\nendobj\n")
+        else:
+            self._file.write(body + b"\nstream\n" + stream + b"\nendstream\nendobj\n")
+
+    def _write_image(self, template_path):
+        with Image.open(template_path) as image:
+            size = image.size
+            if image.format == "JPEG" and image.mode in ("RGB", "L"):
+                with open(template_path, "rb") as f:
+                    data = f.read()
+                colorspace = "/DeviceRGB" if image.mode == "RGB" else "/DeviceGray"
+            else:
+                # Not a plain JPEG: encode it once for the whole document
+                buffer = io.BytesIO()
+                image.convert("RGB").save(buffer, "JPEG", quality=90)
+                data = buffer.getvalue()
+                colorspace = "/DeviceRGB"
+        obj_id = self._alloc()
+        self._write_object(obj_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {size[0]} /Height {size[1]} "
+            f"/ColorSpace {colorspace} /BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>"
+        ).encode(), data)
+        return obj_id, size
+
+    def _font_resource(self, font):
+        entry = self._fonts.get(font.path)
+        if entry is None:
+            entry = self._fonts[font.path] = _EmbeddedFont(font.path, f"F{len(self._fonts) + 1}", self._alloc())
+        return entry
+
+    def add_page(self, placements):
+        """Add a certificate; placements are (x, y, text, font) in template pixels."""
+        ops = self._certificate_ops(placements)
+        if not self._sheet:
+            self._write_page(ops, self.page_width, self.page_height)
+            return
+        self._slots.append(ops)
+        if len(self._slots) == len(self._slot_origins):
+            self._write_sheet()
+
+    def _write_sheet(self):
+        ops = []
+        w = self.page_width * self._slot_scale
+        h = self.page_height * self._slot_scale
+        for slot_ops, (x, y) in zip(self._slots, self._slot_origins):
+            ops.append(f"q {_fmt(self._slot_scale)} 0 0 {_fmt(self._slot_scale)} {_fmt(x)} {_fmt(y)} cm".encode())
+            ops.extend(slot_ops)
+            ops.append(b"Q")
+            if len(self._slot_origins) > 1:
+                ops.append(_crop_marks(x, y, w, h))
+        self._write_page(ops, self._sheet.width, self._sheet.height)
+        self._slots = []
+
+    def _certificate_ops(self, placements):
+        s = self._scale
+        ops = [f"q {_fmt(self.page_width)} 0 0 {_fmt(self.page_height)} 0 0 cm /Im0 Do Q".encode(), b"BT 0 g"]
+        current = None
+        for x, y, text, font in placements:
+            embedded = self._font_resource(font)
+            if (embedded.name, font.size) != current:
+                ops.append(f"/{embedded.name} {_fmt(font.size * s)} Tf".encode())
+                current = (embedded.name, font.size)
+            # PIL anchors text at the ascender; PDF at the baseline
+            baseline = y + font.getmetrics()[0]
+            ops.append(f"1 0 0 1 {_fmt(x * s)} {_fmt((self._height_px - baseline) * s)} Tm ".encode()
+                       + embedded.encode(text) + b" Tj")
+        ops.append(b"ET")
+        return ops
+
+    def _write_page(self, ops, width, height):
+        content = zlib.compress(b"\n".join(ops))
+        content_id = self._alloc()
+        self._write_object(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>".encode(), content)
+        page_id = self._alloc()
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_fmt(width)} {_fmt(height)}] "
+            f"/Contents {content_id} 0 R /Resources 3 0 R >>"
+        ).encode())
+        self._pages.append(page_id)
+
+    def _write_font(self, font):
+        chars = "".join(font.used.values())
+        data = font_bytes(font.path)
+        try:
+            data = subset_truetype(data, chars)
+            tag = "".join(chr(65 + b % 26) for b in hashlib.md5("".join(sorted(chars)).encode()).digest()[:6]) + "+"
+        except Exception:
+            tag = ""  # unusual font layout: embed it whole
+
+        metrics_font = get_font(font.path, 1000)
+        family, style = metrics_font.getname()
+        base_font = tag + f"{family}-{style}".replace(" ", "")
+        ascent, descent = metrics_font.getmetrics()
+
+        font_file = zlib.compress(data)
+        file_id = self._alloc()
+        self._write_object(file_id, (
+            f"<< /Length {len(font_file)} /Length1 {len(data)} /Filter /FlateDecode >>"
+        ).encode(), font_file)
+        descriptor_id = self._alloc()
+        self._write_object(descriptor_id, (
+            f"<< /Type /FontDescriptor /FontName /{base_font} /Flags 32 "
+            f"/FontBBox [0 {-descent} 1000 {ascent}] /ItalicAngle 0 /Ascent {ascent} /Descent {-descent} "
+            f"/CapHeight {ascent} /StemV 80 /FontFile2 {file_id} 0 R >>"
+        ).encode())
+        cid_font_id = self._alloc()
+        self._write_object(cid_font_id, (
+            f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{base_font} "
+            f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            f"/FontDescriptor {descriptor_id} 0 R /CIDToGIDMap /Identity /W [{font.widths()}] >>"
+        ).encode())
+        to_unicode = zlib.compress(font.to_unicode())
+        to_unicode_id = self._alloc()
+        self._write_object(to_unicode_id, f"<< /Length {len(to_unicode)} /Filter /FlateDecode >>".encode(),
+                           to_unicode)
+        self._write_object(font.obj_id, (
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{base_font} /Encoding /Identity-H "
+            f"/DescendantFonts [{cid_font_id} 0 R] /ToUnicode {to_unicode_id} 0 R >>"
+        ).encode())
+
+    def close(self):
+        # A last, partly filled print sheet
+        if self._slots:
+            self._write_sheet()
+        # Fonts go last, once we know every glyph the pages use
+        for font in self._fonts.values():
+            self._write_font(font)
+
+        fonts = " ".join(f"/{font.name} {font.obj_id} 0 R" for font in self._fonts.values())
+        self._write_object(3, f"<< /XObject << /Im0 {self._image_id} 0 R >> /Font << {fonts} >> >>".encode())
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._pages)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref = self._file.tell()
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n0000000000 65535 f \n".encode()]
+        for obj_id in range(1, size):
+            lines.append(f"{self._offsets[obj_id]:010d} 00000 n \n".encode())
+        self._file.write(b"".join(lines))
+        self._file.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
@@ -0,0 +1,92 @@
+# preview.py
+from PIL import Image, ImageDraw
+from engine import draw_placements, layout_certificate, load_fonts, scale_placements
+from naming import certificate_filename
+from roster import open_roster
+from template_cache import get_preview_template
+import base64
+import io
+import os
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Thumbnails are this fraction of the template size (2000px -> 500px)
+PREVIEW_SCALE = float(os.environ.get("PREVIEW_SCALE", 0.25))
+# Rows previewed when none are chosen, and the most that can be asked for
+PREVIEW_ROWS = 6
+PREVIEW_MAX_ROWS = 24
+
+
+def parse_row_selection(text):
+    """Parse "2, 5, 10-12" into sorted sheet line numbers (row 1 is the header)."""
+    lines = set()
+    for part in (text or "").replace(" ", "").split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        try:
+            start, end = int(start), int(end or start)
+        except ValueError:
+            raise ValueError(f"'{part}' is not a row number or range")
+        if start < 2 or end < start:
+            raise ValueError(f"'{part}' is not a valid row range (data starts on row 2)")
+        lines.update(range(start, min(end, start + PREVIEW_MAX_ROWS) + 1))
+    return sorted(lines)[:PREVIEW_MAX_ROWS]
+
+
+def _select_rows(rows, lines, count):
+    if not lines:
+        for i, row in enumerate(rows):
+            if i >= count:
+                return
+            yield row
+        return
+    wanted = set(lines)
+    last = max(lines)
+    for row in rows:
+        if row.line > last:
+            return
+        if row.line in wanted:
+            yield row
+            wanted.discard(row.line)
+            if not wanted:
+                return
+
+
+def render_preview(excel_path, template_path, profile, lines=None, count=PREVIEW_ROWS, scale=PREVIEW_SCALE):
+    """Render a few roster rows as small PNG thumbnails.
+
+    Layout is the same engine.layout_certificate a full run uses (at template
+    resolution, so line breaks match exactly); only the drawing is scaled,
+    onto a downsampled cached template. Returns a list of dicts with line,
+    name, filename, errors and png (bytes, None if the row can't be laid out).
+    """
+    with Image.open(template_path) as source:
+        canvas_width, canvas_height = source.size
+    thumb_template = get_preview_template(template_path, scale)
+    sx = thumb_template.width / canvas_width
+    sy = thumb_template.height / canvas_height
+    fonts = load_fonts(profile)
+
+    rows, _ = open_roster(excel_path)
+    previews = []
+    try:
+        for row in _select_rows(rows, lines, min(count, PREVIEW_MAX_ROWS)):
+            writeup, stamps, errors = layout_certificate(row, profile, fonts, canvas_width)
+            preview = {"line": row.line, "name": row.name, "filename": certificate_filename(row),
+                       "errors": errors, "png": None}
+            if writeup is not None:
+                thumb = thumb_template.copy()
+                draw_placements(ImageDraw.Draw(thumb), scale_placements(writeup + stamps, sx, sy))
+                buffer = io.BytesIO()
+                thumb.save(buffer, "PNG", compress_level=1)
+                preview["png"] = buffer.getvalue()
+            previews.append(preview)
+    finally:
+        rows.close()
+    return previews
+
+
+def png_data_url(png):
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
@@ -0,0 +1,145 @@
+# render_pool.py
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import math
+import multiprocessing
+import os
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Default worker count never goes above this, however many CPUs there are
+RENDER_MAX_WORKERS = int(os.environ.get("RENDER_MAX_WORKERS", 4))
+
+
+def available_cpus():
+    """CPUs this process may actually use: its affinity mask and any cgroup v2 quota.
+
+    os.cpu_count() is the host's count, which in a container can be far
+    more than the quota allows.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+# Number of worker processes used for rendering (1 = render in-process).
+# Every running job starts its own pool, and each render worker peaks at
+# about 160 MiB with the bundled templates (result["memory"]), so the
+# ceiling for rendering is roughly
+#     gunicorn workers x JOB_WORKERS x RENDER_WORKERS x 160 MiB
+# e.g. 2 x 1 x 4 x 160 MiB = 1.3 GiB with the defaults on a 4+ CPU machine.
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", min(available_cpus(), RENDER_MAX_WORKERS)))
+# Upper bound on rows sent to a worker in one task
+RENDER_CHUNK_SIZE = int(os.environ.get("RENDER_CHUNK_SIZE", 50))
+# Chunks queued or running per worker. The roster is read, and finished
+# results held, no further ahead than this, so memory stays flat however
+# long the roster is and a slow consumer holds the workers back.
+RENDER_MAX_IN_FLIGHT = int(os.environ.get("RENDER_MAX_IN_FLIGHT", 2))
+# How pool workers are started. Not "fork": pools are started from job
+# threads, and a fork copies whatever locks other threads hold at that
+# moment (layout, template_cache and metrics all have one), leaving the
+# workers hung for good. forkserver workers start from a clean process and
+# load what they need in the initializer.
+RENDER_START_METHOD = os.environ.get("RENDER_START_METHOD", "forkserver")
+
+
+def chunk_rows(rows, chunk_size):
+    """Lazily split any iterable of rows into lists of at most chunk_size."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# The initializer's result, in pool worker processes only
+_pool_state = None
+
+
+def _pool_init(initializer, initargs):
+    global _pool_state
+    _pool_state = initializer(*initargs)
+
+
+def _pool_render(render_chunk, chunk):
+    return render_chunk(chunk, _pool_state)
+
+
+def _mp_context(render_chunk):
+    context = multiprocessing.get_context(RENDER_START_METHOD)
+    if RENDER_START_METHOD == "forkserver":
+        # Workers fork from the server with the rendering module imported, not
+        # importing it afresh each; only takes effect before the server starts
+        context.set_forkserver_preload([render_chunk.__module__])
+    return context
+
+
+def render_chunks(rows, render_chunk, initializer, initargs=(), workers=None, chunk_size=None, total=None):
+    """Render rows with render_chunk, in-process or across a process pool.
+
+    rows may be a list or a generator (e.g. roster.open_roster); total is the
+    expected row count when rows has no len(), used only to size chunks.
+    initializer(*initargs) runs once per worker to load fonts and templates
+    and returns that worker's state; render_chunk(rows, state) must be a
+    module-level function returning one result per row. Rendering
+    in-process hands the state straight to render_chunk, so concurrent
+    in-process runs (e.g. job threads) never share it. Yields each chunk's results in the original row order, so
+    callers can report progress as chunks finish. At most
+    workers * RENDER_MAX_IN_FLIGHT chunks are submitted at a time.
+    """
+    if total is None and hasattr(rows, "__len__"):
+        total = len(rows)
+    workers = workers or RENDER_WORKERS
+    if total == 0:
+        return
+
+    if chunk_size is None:
+        chunk_size = RENDER_CHUNK_SIZE
+        if total:
+            # Several chunks per worker so a slow chunk doesn't leave cores idle
+            chunk_size = max(1, min(RENDER_CHUNK_SIZE, math.ceil(total / (workers * 4))))
+    if total:
+        workers = min(workers, math.ceil(total / chunk_size))
+    chunks = chunk_rows(rows, chunk_size)
+
+    if workers <= 1:
+        state = initializer(*initargs)
+        for chunk in chunks:
+            yield render_chunk(chunk, state)
+        return
+
+    max_in_flight = workers * max(1, RENDER_MAX_IN_FLIGHT)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context(render_chunk),
+                             initializer=_pool_init, initargs=(initializer, initargs)) as pool:
+        # Unlike pool.map, which submits every chunk up front
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(_pool_render, render_chunk, chunk))
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def render_rows(rows, render_chunk, initializer, initargs=(), workers=None, chunk_size=None, total=None):
+    """Like render_chunks, but returns one flat list of per-row results."""
+    results = []
+    for chunk_results in render_chunks(rows, render_chunk, initializer, initargs, workers, chunk_size, total):
+        results.extend(chunk_results)
+    return results
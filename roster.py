@@ -0,0 +1,190 @@
+# roster.py
+from openpyxl import load_workbook
+from collections import namedtuple
+from datetime import datetime
+import codecs
+import csv
+import os
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Expected columns, in order, with words we accept in each header cell
+COLUMNS = [
+    ("name", ("name",)),
+    ("date", ("date",)),
+    ("write-up", ("write", "text", "paragraph", "description")),
+    ("certificate ID", ("id", "cert", "number", "no")),
+    ("course", ("course", "programme", "program", "title")),
+]
+ROSTER_EXTENSIONS = {"xlsx", "csv"}
+STRING_DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d")
+# CSVs that aren't valid UTF-8 are read as this: what Excel's plain
+# "CSV (Comma delimited)" writes on Windows
+CSV_FALLBACK_ENCODING = "cp1252"
+
+RosterRow = namedtuple("RosterRow", "line name date writeup cert_id course date_error")
+
+
+class RosterError(Exception):
+    pass
+
+
+def get_day_with_suffix(day):
+    if 10 <= day % 100 <= 20:
+        return f"{day}th"
+    return f"{day}{ {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')}"
+
+
+def _format_day(date):
+    return f"{get_day_with_suffix(date.day)} of {date.strftime('%B')}"
+
+
+def format_date(raw_date):
+    """Normalise a date cell to e.g. "3rd of March".
+
+    Returns (formatted_date, error); unparseable strings pass through as-is.
+    """
+    try:
+        if isinstance(raw_date, datetime):
+            return _format_day(raw_date), None
+        if isinstance(raw_date, (int, float)):
+            # Excel serial date
+            excel_date = datetime.fromordinal(datetime(1900, 1, 1).toordinal() + int(raw_date) - 2)
+            return _format_day(excel_date), None
+        if isinstance(raw_date, str):
+            for date_format in STRING_DATE_FORMATS:
+                try:
+                    return _format_day(datetime.strptime(raw_date.strip(), date_format)), None
+                except ValueError:
+                    pass
+            return raw_date.strip(), None
+        return str(raw_date), None
+    except Exception as e:
+        return str(raw_date), e
+
+
+def _header_key(cell):
+    return "".join(c for c in str(cell or "").lower() if c.isalnum() or c == " ")
+
+
+def validate_header(header):
+    """Raise RosterError unless header has the five columns in the expected order."""
+    if header is None:
+        raise RosterError("The sheet is empty.")
+    header = list(header)
+    if len([cell for cell in header[:5] if cell not in (None, "")]) < 5:
+        expected = ", ".join(label for label, _ in COLUMNS)
+        raise RosterError(f"Expected 5 columns ({expected}) but the header row has fewer.")
+
+    # Catch swapped columns: a header naming a different column and not its own
+    for position, (label, words) in enumerate(COLUMNS):
+        cell_words = _header_key(header[position]).split()
+        cell_text = "".join(cell_words)
+        if any(word in cell_text for word in words):
+            continue
+        for other_label, other_words in COLUMNS:
+            if other_label != label and any(word in cell_words for word in other_words):
+                raise RosterError(
+                    f"Column {position + 1} is '{header[position]}' but should be the {label} column."
+                )
+
+
+def _cell(value):
+    return str(value).strip() if value else ""
+
+
+def _normalise(raw_rows, first_line):
+    for line, row in enumerate(raw_rows, start=first_line):
+        row = (tuple(row) + (None,) * 5)[:5]
+        name = _cell(row[0])
+        course = _cell(row[4])
+        if not name or not course:
+            continue
+        formatted_date, date_error = format_date(row[1])
+        yield RosterRow(line, name, formatted_date, _cell(row[2]), _cell(row[3]), course, date_error)
+
+
+def _xlsx_rows(wb):
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _csv_rows(handle):
+    with handle:
+        yield from csv.reader(handle)
+
+
+def _csv_encoding(path):
+    """Return (encoding, row_count) for a CSV, checking the whole file up front.
+
+    Rows are decoded lazily, so a bad byte halfway down the sheet would
+    otherwise only surface mid-run, after earlier rows had rendered.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    fallback = codecs.getincrementaldecoder(CSV_FALLBACK_ENCODING)()
+    is_utf8 = is_fallback = True
+    lines = 0
+    with open(path, "rb") as f:
+        for line in f:
+            lines += 1
+            if is_utf8:
+                try:
+                    utf8.decode(line)
+                except UnicodeDecodeError:
+                    is_utf8 = False
+            if is_fallback:
+                try:
+                    fallback.decode(line)
+                except UnicodeDecodeError:
+                    is_fallback = False
+    row_count = max(lines - 1, 0)
+    if is_utf8:
+        try:
+            utf8.decode(b"", final=True)
+            return "utf-8-sig", row_count
+        except UnicodeDecodeError:
+            pass
+    if is_fallback:
+        return CSV_FALLBACK_ENCODING, row_count
+    raise RosterError("The CSV file's text encoding isn't recognised. In Excel, save it as \"CSV UTF-8\".")
+
+
+def _open_raw(path):
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension == "csv":
+        encoding, row_count = _csv_encoding(path)
+        return _csv_rows(open(path, newline="", encoding=encoding)), row_count
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    max_row = wb.active.max_row
+    row_count = max(max_row - 1, 0) if max_row else None
+    return _xlsx_rows(wb), row_count
+
+
+def open_roster(path):
+    """Open a .xlsx or .csv roster and validate its header.
+
+    Returns (rows, row_count): rows is a generator of RosterRow that streams
+    the file (openpyxl read-only mode for .xlsx), and row_count is an upper
+    bound on the data rows, or None if unknown. Raises RosterError for a bad
+    header, before any row is read.
+    """
+    raw_rows, row_count = _open_raw(path)
+    try:
+        validate_header(next(raw_rows, None))
+    except Exception:
+        raw_rows.close()
+        raise
+    return _normalise(raw_rows, first_line=2), row_count
+
+
+def check_roster(path):
+    """Validate just the header of a roster file (raises RosterError)."""
+    raw_rows, _ = _open_raw(path)
+    try:
+        validate_header(next(raw_rows, None))
+    finally:
+        raw_rows.close()
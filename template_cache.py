@@ -0,0 +1,157 @@
+# template_cache.py
+from PIL import Image, ImageDraw
+from collections import OrderedDict
+import os
+import threading
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# A decoded 2000x1414 RGB template is ~11 MB, so the default cap holds all
+# four bundled templates with room to spare.
+TEMPLATE_CACHE_MAX_BYTES = int(os.environ.get("TEMPLATE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Templates with a write-up paragraph already drawn on (see get_paragraph_layer)
+LAYER_CACHE_MAX_BYTES = int(os.environ.get("LAYER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# How many distinct paragraphs we remember having seen once
+LAYER_SEEN_SIZE = 1024
+
+
+def _image_size(image):
+    # Pillow keeps multi-band images (RGB included) at 4 bytes per pixel
+    pixel_bytes = 4 if len(image.getbands()) > 1 or image.mode in ("I", "F") else 1
+    return image.width * image.height * pixel_bytes
+
+
+class _ImageLRU:
+    """LRU of images capped by their total decoded size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (image, keepalive)
+
+    def get(self, key):
+        with self.lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, image, keepalive=None):
+        with self.lock:
+            if key not in self._data:
+                self._data[key] = (image, keepalive)
+                self.size += _image_size(image)
+            self._data.move_to_end(key)
+            # Always keep the most recently used entry, even if it alone exceeds the cap
+            while self.size > self.max_bytes and len(self._data) > 1:
+                _, (old, _) = self._data.popitem(last=False)
+                self.size -= _image_size(old)
+            return self._data[key][0]
+
+    def discard(self, match):
+        with self.lock:
+            for key in [k for k in self._data if match(k)]:
+                old, _ = self._data.pop(key)
+                self.size -= _image_size(old)
+
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+            self.size = 0
+
+
+_templates = _ImageLRU(TEMPLATE_CACHE_MAX_BYTES)  # (abs_path, mtime[, scale]) -> RGB Image
+_layers = _ImageLRU(LAYER_CACHE_MAX_BYTES)  # (id(template), group) -> layer
+_layers_seen = OrderedDict()
+
+
+def get_template(template_path):
+    """Return the decoded RGB template for template_path.
+
+    The image is shared between callers: always work on a .copy() of it.
+    Entries are keyed by (path, mtime) so an edited template is re-decoded.
+    """
+    path = os.path.abspath(template_path)
+    key = (path, os.path.getmtime(path))
+
+    image = _templates.get(key)
+    if image is not None:
+        return image
+
+    with Image.open(path) as source:
+        image = source.convert("RGB")
+
+    # Drop stale decodes of the same file (older mtime)
+    _templates.discard(lambda k: k[0] == path and k[1] != key[1])
+    return _templates.put(key, image)
+
+
+def get_preview_template(template_path, scale):
+    """Return the template downsampled by scale (e.g. 0.25), cached like get_template.
+
+    JPEGs are decoded in draft mode, straight at a reduced size, so a
+    preview never pays for a full-resolution decode.
+    """
+    path = os.path.abspath(template_path)
+    key = (path, os.path.getmtime(path), scale)
+
+    image = _templates.get(key)
+    if image is not None:
+        return image
+
+    with Image.open(path) as source:
+        size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+        source.draft("RGB", size)
+        image = source.convert("RGB")
+    if image.size != size:
+        image = image.resize(size, Image.Resampling.BILINEAR)
+
+    _templates.discard(lambda k: k[0] == path and k[1] != key[1])
+    return _templates.put(key, image)
+
+
+def get_paragraph_layer(template_image, group_key, paint):
+    """Return template_image with paint(draw) baked in, cached per group_key.
+
+    Rows that share a write-up (same text, course, date and fonts — the
+    group_key) only differ in name and certificate ID, so the paragraph is
+    baked onto the template once per group. Returns None the first time a
+    group is seen: a one-off paragraph is cheaper drawn straight onto the
+    certificate than onto an extra cached copy. Treat the result as
+    read-only and .copy() it.
+    """
+    key = (id(template_image), group_key)
+    layer = _layers.get(key)
+    if layer is not None:
+        return layer
+
+    with _layers.lock:
+        if key not in _layers_seen:
+            _layers_seen[key] = True
+            if len(_layers_seen) > LAYER_SEEN_SIZE:
+                _layers_seen.popitem(last=False)
+            return None
+
+    layer = template_image.copy()
+    paint(ImageDraw.Draw(layer))
+    # Holding template_image in the entry keeps its id() from being reused
+    return _layers.put(key, layer, keepalive=template_image)
+
+
+def preload_templates(template_paths):
+    for template_path in template_paths:
+        try:
+            get_template(template_path)
+            print(f"✅ Template cached: {template_path}")
+        except Exception as e:
+            print(f"❌ Template preload failed for {template_path}: {e}")
+
+
+def clear_template_cache():
+    _templates.clear()
+    _layers.clear()
+    with _layers.lock:
+        _layers_seen.clear()
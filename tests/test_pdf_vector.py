@@ -0,0 +1,79 @@
+# tests/test_pdf_vector.py
+"""Round-trip VectorPdf pages through a PDF reader.
+
+    pip install -r requirements-dev.txt
+    python -m unittest discover tests
+"""
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import ImageFont  # noqa: E402
+from pypdf import PdfReader  # noqa: E402
+from font_registry import font_bytes, get_font  # noqa: E402
+from pdf_vector import PRINT_SHEETS, VectorPdf, _cmap_format4, _table_offsets, subset_truetype  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE = os.path.join(ROOT, "static", "Template7.jpg")
+FONT = os.path.join(ROOT, "fonts", "arial.ttf")
+# Outside cp1252: these used to come out as "?"
+NAMES = ["Ọlájídé Adébáyọ̀", "Şükrü Çelik"]
+
+
+def _write(path, names, sheet=None):
+    font = get_font(FONT, 60)
+    with VectorPdf(path, TEMPLATE, sheet=sheet) as pdf:
+        for name in names:
+            pdf.add_page([(200, 300, name, font), (200, 500, "Certificate of Completion", font)])
+
+
+class VectorPdfRoundTrip(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "out.pdf")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_names_round_trip(self):
+        _write(self.path, NAMES)
+        reader = PdfReader(self.path, strict=True)
+        self.assertEqual(len(reader.pages), len(NAMES))
+        for page, name in zip(reader.pages, NAMES):
+            text = page.extract_text()
+            self.assertIn(name, text)
+            self.assertIn("Certificate of Completion", text)
+            self.assertNotIn("?", text)
+
+    def test_print_sheet_round_trip(self):
+        _write(self.path, NAMES * 2 + NAMES[:1], sheet=PRINT_SHEETS["a3-4up"])
+        reader = PdfReader(self.path, strict=True)
+        self.assertEqual(len(reader.pages), 2)
+        text = reader.pages[0].extract_text()
+        for name in NAMES:
+            self.assertIn(name, text)
+
+
+class SubsetTrueType(unittest.TestCase):
+    def test_keeps_used_glyphs_at_their_ids(self):
+        data = font_bytes(FONT)
+        chars = "".join(NAMES)
+        subset = subset_truetype(data, chars)
+        self.assertLess(len(subset), len(data) // 4)
+        lookup = _cmap_format4(subset, _table_offsets(subset)[b"cmap"])
+        original = _cmap_format4(data, _table_offsets(data)[b"cmap"])
+        for char in chars:
+            self.assertEqual(lookup(ord(char)), original(ord(char)))
+            self.assertNotEqual(lookup(ord(char)), 0, char)
+        # The subset still loads as a font and draws the names
+        font = ImageFont.truetype(io.BytesIO(subset), 40)
+        self.assertIsNotNone(font.getbbox(NAMES[0]))
+        self.assertAlmostEqual(font.getlength(NAMES[0]), get_font(FONT, 40).getlength(NAMES[0]), delta=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
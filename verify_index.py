@@ -0,0 +1,105 @@
+# verify_index.py
+import os
+import sqlite3
+import time
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Every issued certificate, keyed by certificate ID, for /verify lookups.
+# Next to the code rather than in the working directory, so cli.py runs
+# from cron record into the same index the web app reads.
+VERIFY_DB_PATH = os.environ.get("VERIFY_DB_PATH", os.path.join(BASE_DIR, "certificates.db"))
+# Rows written per transaction while a batch is generating
+VERIFY_BATCH_SIZE = 500
+# SQLite's default limit on ? parameters is 999
+LOOKUP_BATCH_SIZE = 900
+
+
+def _connect():
+    conn = sqlite3.connect(VERIFY_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_db():
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        # cert_id is the primary key, so lookups are an index seek however
+        # many certificates have been issued; re-issuing an ID replaces it
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS issued (
+                cert_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                course TEXT NOT NULL,
+                date TEXT NOT NULL,
+                template TEXT NOT NULL,
+                layout TEXT NOT NULL,
+                output_hash TEXT,
+                issued_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+    conn.close()
+
+
+def record_issued(records):
+    """Write (cert_id, name, course, date, template, layout, output_hash) tuples in one transaction."""
+    if not records:
+        return
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO issued (cert_id, name, course, date, template, layout, output_hash, issued_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(*record, now) for record in records],
+        )
+    conn.close()
+
+
+class IssuedRecorder:
+    """Collects issued rows during a run and writes them VERIFY_BATCH_SIZE at a time."""
+
+    def __init__(self, template_path, layout):
+        self.template = os.path.basename(template_path)
+        self.layout = layout
+        self.pending = []
+        self.count = 0
+
+    def add(self, row, output_hash):
+        if not row.cert_id:
+            return
+        self.pending.append((row.cert_id, row.name, row.course, row.date, self.template, self.layout, output_hash))
+        if len(self.pending) >= VERIFY_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        record_issued(self.pending)
+        self.count += len(self.pending)
+        self.pending = []
+
+
+def lookup(cert_id):
+    """Return the issued record for cert_id as a dict, or None."""
+    conn = _connect()
+    row = conn.execute("SELECT * FROM issued WHERE cert_id = ?", (cert_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def lookup_many(cert_ids):
+    """Return {cert_id: record or None} for a list of IDs."""
+    found = {}
+    unique = list(dict.fromkeys(cert_ids))
+    conn = _connect()
+    for start in range(0, len(unique), LOOKUP_BATCH_SIZE):
+        batch = unique[start:start + LOOKUP_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        for row in conn.execute(f"SELECT * FROM issued WHERE cert_id IN ({placeholders})", batch):
+            found[row["cert_id"]] = dict(row)
+    conn.close()
+    return {cert_id: found.get(cert_id) for cert_id in unique}
+
+
+init_db()
@@ -0,0 +1,71 @@
+# zip_stream.py
+import os
+import zipfile
+
+# Bytes read from each file per write; also the largest chunk held in memory
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _StreamBuffer:
+    """Write-only, unseekable sink that ZipFile writes into.
+
+    ZipFile falls back to data descriptors when the target can't seek,
+    so we can hand out whatever it has written so far after every chunk.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive piece by piece.
+
+    entries is an iterable of (file_path, arcname). Files are STORED, not
+    DEFLATEd — PDFs are already compressed, so deflating only burns CPU.
+    Memory use stays at roughly one chunk regardless of archive size.
+    """
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zipf:
+        for file_path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(file_path, arcname)
+            info.compress_type = zipfile.ZIP_STORED
+            with open(file_path, "rb") as src, zipf.open(info, "w") as dest:
+                while True:
+                    block = src.read(ZIP_STREAM_CHUNK_SIZE)
+                    if not block:
+                        break
+                    dest.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def directory_entries(directory, filenames):
+    for filename in filenames:
+        file_path = os.path.join(directory, filename)
+        if os.path.isfile(file_path):
+            yield file_path, filename